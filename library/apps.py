@@ -6,4 +6,5 @@ class LibraryConfig(AppConfig):
     name = "library"
 
     def ready(self):
+        import library.collectors
         import library.signals
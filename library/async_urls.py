@@ -0,0 +1,37 @@
+"""
+library.urls with the catalog and borrowing reads served by async views.
+
+The async patterns come first and keep the router's names, so reverse()
+gives the same URLs; every other route is library.urls unchanged.
+"""
+from django.urls import re_path
+
+from library.urls import urlpatterns as sync_urlpatterns
+from library.views import BookViewSet, BorrowingViewSet
+
+
+app_name = "library"
+
+urlpatterns = [
+    re_path(
+        r"^books/$",
+        BookViewSet.as_async_view({"get": "list", "post": "create"}),
+        name="book-list",
+    ),
+    re_path(
+        r"^books/(?P<pk>\d+)/$",
+        BookViewSet.as_async_view({"get": "retrieve"}),
+        name="book-detail",
+    ),
+    re_path(
+        r"^borrowings/$",
+        BorrowingViewSet.as_async_view({"get": "list", "post": "create"}),
+        name="borrowing-list",
+    ),
+    re_path(
+        r"^borrowings/(?P<pk>\d+)/$",
+        BorrowingViewSet.as_async_view({"get": "retrieve"}),
+        name="borrowing-detail",
+    ),
+    *sync_urlpatterns,
+]
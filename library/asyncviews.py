@@ -0,0 +1,106 @@
+"""
+Async request handling for DRF views under ASGI.
+
+DRF's APIView is synchronous: served by an ASGI server, every request
+would hold one of asgiref's worker threads while it waits on Postgres.
+AsyncViewMixin.as_async_view() returns an async Django view for reads
+whose ``a``-prefixed handler (``alist`` for ``list``, ``aget`` for
+``get``) awaits the async ORM. Everything around the handler is DRF's and
+simplejwt's own code: APIView.initial (negotiation, authentication,
+permissions, throttles) runs in a thread, and exception handling and
+rendering run as they are. Other methods and the browsable API are handed
+to the ordinary view in a thread.
+
+adispatch() follows APIView.dispatch of the pinned djangorestframework
+(see requirements.txt); check it when upgrading.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from rest_framework import exceptions
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request
+
+
+def plain_response(response):
+    """
+    Render a DRF response into an HttpResponse.
+
+    Django's async handler renders anything with a ``render`` method in a
+    thread; the rendered bytes are returned as they are.
+    """
+    if not hasattr(response, "render"):
+        return response
+    response.render()
+    plain = HttpResponse(
+        response.content,
+        status=response.status_code,
+        headers=response.headers,
+    )
+    plain.cookies = response.cookies
+    return plain
+
+
+class AsyncViewMixin:
+    # Adds as_async_view(); see library.asyncviews. Views define async
+    # handlers named after the sync ones with an "a" prefix.
+
+    @classonlymethod
+    def as_async_view(cls, actions=None, **initkwargs):
+        """
+        Return an async view for ``cls``; ``actions`` as for ViewSet.as_view.
+
+        A GET is served in the event loop when the view has the matching
+        async handler; anything else goes to ``cls.as_view()`` in a thread.
+        """
+        if actions:
+            sync_view = sync_to_async(cls.as_view(actions, **initkwargs))
+        else:
+            sync_view = sync_to_async(cls.as_view(**initkwargs))
+        name = (actions or {"get": "get"}).get("get")
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            handler = None
+            if request.method == "GET" and name:
+                handler = getattr(self, "a" + name, None)
+            if handler is None or self.wants_browsable_api(request, **kwargs):
+                return await sync_view(request, *args, **kwargs)
+
+            if actions:
+                self.action_map = actions
+                for method, action in actions.items():
+                    setattr(self, method, getattr(self, action))
+            response = await self.adispatch(handler, request, *args, **kwargs)
+            return plain_response(response)
+
+        view.__doc__ = cls.__doc__
+        view.__module__ = cls.__module__
+        view.csrf_exempt = True
+        return view
+
+    def wants_browsable_api(self, request, **kwargs):
+        # The browsable API renders forms with sync queries.
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        try:
+            renderer, _ = self.perform_content_negotiation(Request(request))
+        except exceptions.NotAcceptable:
+            return True
+        return isinstance(renderer, BrowsableAPIRenderer)
+
+    async def adispatch(self, handler, request, *args, **kwargs):
+        """APIView.dispatch, awaiting ``handler``."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,1133 @@
+"""Performance scenarios run by ``python manage.py benchmark``.
+
+Every scenario seeds the rows it needs, drives the same code path the API
+uses and returns a flat dict of metrics for the command to print.
+"""
+import asyncio
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library import cache as catalog
+from library import metrics as exposition
+from library.models import (
+    Book,
+    Borrowing,
+    Cover,
+    Notification,
+    OutboxEvent,
+    Payment,
+)
+from library.pagination import encode_cursor
+from library.renderers import MessagePackRenderer, ORJSONRenderer
+from library.payments import PaymentClient
+from library.serializers import BookListSerializer, BorrowingListSerializer
+from library.stripe_stub import StripeStub
+from library.tasks import (
+    billable_borrowings,
+    check_overdue_borrowings,
+    create_payment_sessions,
+    process_webhook_events,
+    relay_outbox,
+    send_notification,
+    send_notifications,
+)
+from library.telegram import TelegramClient
+from library.telegram_stub import TelegramStub
+from library.instrumentation import Recorder
+from library.views import BookViewSet, BorrowingViewSet, StripeWebhookView
+from user.models import User
+
+
+SCENARIOS = {}
+
+factory = APIRequestFactory(SERVER_NAME="localhost")
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def run_threads(func, threads, calls_per_thread, queries=None):
+    """
+    Call ``func`` from ``threads`` threads and return per-call latencies.
+
+    Pass a QueryCounter as ``queries`` to count the queries of every thread.
+    """
+    barrier = threading.Barrier(threads)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        try:
+            wrapper = passthrough if queries is None else queries
+            with connection.execute_wrapper(wrapper):
+                barrier.wait()
+                for _ in range(calls_per_thread):
+                    started = time.perf_counter()
+                    func()
+                    local.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies
+
+
+def passthrough(execute, sql, params, many, context):
+    return execute(sql, params, many, context)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """Count the queries run on this thread's connection, without logging them."""
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def percentile(latencies, q):
+    """Return the ``q``-th percentile of ``latencies`` in milliseconds."""
+    ordered = sorted(latencies)
+    index = min(int(len(ordered) * q / 100), len(ordered) - 1)
+    return round(ordered[index] * 1000, 2)
+
+
+def summarize(latencies, elapsed, queries, prefix=""):
+    """The standard request metrics: throughput, latency percentiles, queries."""
+    return {
+        f"{prefix}requests/s": round(len(latencies) / elapsed, 1),
+        f"{prefix}p50 ms": percentile(latencies, 50),
+        f"{prefix}p95 ms": percentile(latencies, 95),
+        f"{prefix}p99 ms": percentile(latencies, 99),
+        f"{prefix}queries/request": round(len(queries) / len(latencies), 2),
+    }
+
+
+def better_when(metric):
+    """
+    Whether ``metric`` improves going "up" or "down", from its unit.
+
+    Returns None for counts and flags that have no good direction.
+    """
+    if metric.endswith("/s"):
+        return "up"
+    if " ms" in metric or " us" in metric or metric.endswith(" s"):
+        return "down"
+    if "queries" in metric:
+        return "down"
+    return None
+
+
+def compare(baseline, results, tolerance):
+    """
+    Yield ``(scenario, metric, old, new, change %, regressed)`` per metric.
+
+    Only numeric metrics present in both runs with a known direction are
+    compared. A metric regressed when it moved the wrong way by more than
+    ``tolerance`` percent.
+    """
+    for name, metrics in results.items():
+        for metric, new in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            direction = better_when(metric)
+            if direction is None or isinstance(new, bool):
+                continue
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+                continue
+            if old:
+                change = (new - old) / old * 100
+            else:
+                change = 100.0 if new else 0.0
+            worse = -change if direction == "up" else change
+            yield name, metric, old, new, change, worse > tolerance
+
+
+def seed_user(email="bench@example.com"):
+    user, _ = User.objects.get_or_create(email=email)
+    return user
+
+
+def seed_book(inventory, title="Benchmark Book"):
+    return Book.objects.create(
+        title=title,
+        author="Benchmark Author",
+        inventory=inventory,
+        cover=Cover.HARD,
+        daily_fee=1,
+    )
+
+
+def analyze(*models):
+    """Refresh planner statistics after bulk seeding, as autovacuum would."""
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+
+def call_view(actions, method, path, user, data=None, **kwargs):
+    view = BorrowingViewSet.as_view(actions, throttle_classes=())
+    if method == "get":
+        request = factory.get(path, data)
+    else:
+        request = getattr(factory, method)(path, data, format="json")
+    force_authenticate(request, user=user)
+    return view(request, **kwargs)
+
+
+@scenario
+def checkout(threads=16, requests=2000, **options):
+    """Concurrent POST /borrowings/ against a single hot book."""
+    user = seed_user()
+    due = (date.today() + timedelta(days=7)).isoformat()
+    metrics = {}
+
+    for workers in sorted({1, threads}):
+        per_thread = max(requests // workers, 1)
+        book = seed_book(inventory=workers * per_thread)
+        payload = {"book": book.id, "expected_return_date": due}
+
+        queries = QueryCounter()
+        started = time.perf_counter()
+        latencies = run_threads(
+            lambda: call_view({"post": "create"}, "post", "/", user, payload),
+            workers,
+            per_thread,
+            queries,
+        )
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        created = Borrowing.objects.filter(book=book).count()
+        metrics.update(summarize(latencies, elapsed, queries, f"threads={workers} "))
+        metrics[f"threads={workers} checkouts/s"] = round(created / elapsed, 1)
+        metrics[f"threads={workers} inventory drift"] = (
+            book.inventory - (workers * per_thread - created)
+        )
+    return metrics
+
+
+@scenario
+def return_book(threads=16, requests=2000, **options):
+    """Concurrent POST /borrowings/<id>/return_book/ on distinct borrowings."""
+    user = seed_user()
+    book = seed_book(inventory=0)
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(
+            user=user,
+            book=book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        for _ in range(requests)
+    )
+    pending = iter([b.id for b in borrowings])
+    lock = threading.Lock()
+
+    def return_next():
+        with lock:
+            pk = next(pending)
+        call_view({"post": "return_book"}, "post", "/", user, pk=pk)
+
+    queries = QueryCounter()
+    started = time.perf_counter()
+    latencies = run_threads(return_next, threads, requests // threads, queries)
+    elapsed = time.perf_counter() - started
+
+    book.refresh_from_db()
+    return {
+        **summarize(latencies, elapsed, queries),
+        "inventory drift": book.inventory - len(latencies),
+    }
+
+
+@scenario
+def bulk_checkout(requests=2000, **options):
+    """A kiosk visit of 15 books: 15 single POSTs against one bulk POST."""
+    user = seed_user()
+    visits = max(requests // 15, 1)
+    due = (date.today() + timedelta(days=7)).isoformat()
+    books = [seed_book(inventory=2 * visits, title=f"Kiosk {i}") for i in range(15)]
+    book_ids = [book.id for book in books]
+
+    single = []
+    for _ in range(visits):
+        started = time.perf_counter()
+        for book_id in book_ids:
+            call_view(
+                {"post": "create"},
+                "post",
+                "/",
+                user,
+                {"book": book_id, "expected_return_date": due},
+            )
+        single.append(time.perf_counter() - started)
+
+    bulk = []
+    for _ in range(visits):
+        started = time.perf_counter()
+        call_view(
+            {"post": "bulk_checkout"},
+            "post",
+            "/bulk/",
+            user,
+            {"books": book_ids, "expected_return_date": due},
+        )
+        bulk.append(time.perf_counter() - started)
+
+    return {
+        "single p50 ms/visit": percentile(single, 50),
+        "bulk p50 ms/visit": percentile(bulk, 50),
+        "borrowings created": Borrowing.objects.filter(book__in=books).count(),
+    }
+
+
+@scenario
+def bulk_return(**options):
+    """Return a bin of 100 books: 100 single returns against one bulk call."""
+    user = seed_user()
+    books = [seed_book(inventory=0, title=f"Bin {i}") for i in range(10)]
+
+    def seed_bin():
+        return [
+            b.id
+            for b in Borrowing.objects.bulk_create(
+                Borrowing(
+                    user=user,
+                    book=books[i % len(books)],
+                    expected_return_date=date.today() + timedelta(days=7),
+                )
+                for i in range(100)
+            )
+        ]
+
+    ids = seed_bin()
+    with count_queries() as single_queries:
+        started = time.perf_counter()
+        for pk in ids:
+            call_view({"post": "return_book"}, "post", "/", user, pk=pk)
+        single = time.perf_counter() - started
+
+    ids = seed_bin()
+    with count_queries() as bulk_queries:
+        started = time.perf_counter()
+        call_view({"post": "bulk_return"}, "post", "/", user, {"ids": ids})
+        bulk = time.perf_counter() - started
+
+    return {
+        "100 single returns ms": round(single * 1000, 2),
+        "100 single returns queries": len(single_queries),
+        "1 bulk return ms": round(bulk * 1000, 2),
+        "1 bulk return queries": len(bulk_queries),
+    }
+
+
+@scenario
+def overdue_scan(requests=2000, **options):
+    """check_overdue_borrowings over ``requests`` open overdue borrowings."""
+    user = seed_user()
+    book = seed_book(inventory=0)
+    due = date.today() - timedelta(days=3)
+    borrowings = Borrowing.objects.bulk_create(
+        (
+            Borrowing(user=user, book=book, expected_return_date=due)
+            for _ in range(requests)
+        ),
+        batch_size=5000,
+    )
+    Notification.objects.bulk_create(
+        (
+            Notification(type="OVERDUE", borrowing=b, status="SENT")
+            for b in borrowings[::10]
+        ),
+        batch_size=5000,
+    )
+    analyze(Borrowing, Notification)
+
+    with count_queries() as queries:
+        started = time.perf_counter()
+        created = check_overdue_borrowings()
+        elapsed = time.perf_counter() - started
+
+    rescans = []
+    for _ in range(20):
+        started = time.perf_counter()
+        check_overdue_borrowings()
+        rescans.append(time.perf_counter() - started)
+
+    return {
+        "rows scanned": requests,
+        "notifications created": created,
+        "scan ms": round(elapsed * 1000, 2),
+        "rows/s": round(requests / elapsed, 1),
+        "queries": len(queries),
+        "idle rescan p50 ms": percentile(rescans, 50),
+        "idle rescan p95 ms": percentile(rescans, 95),
+        "idle rescan p99 ms": percentile(rescans, 99),
+    }
+
+
+@scenario
+def pagination(**options):
+    """Borrowing list page 1 against page 10,000, by offset and by cursor."""
+    user = seed_user()
+    book = seed_book(inventory=0)
+    limit, page = 5, 10000
+    Borrowing.objects.bulk_create(
+        (
+            Borrowing(
+                user=user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=i % 365),
+            )
+            for i in range(limit * page)
+        ),
+        batch_size=5000,
+    )
+    analyze(Borrowing)
+    ordering = Borrowing._meta.ordering
+    deep = encode_cursor(
+        Borrowing.objects.order_by(*ordering)[limit * (page - 1) - 1], ordering
+    )
+    pages = {
+        "offset page 1": {"limit": limit},
+        f"offset page {page}": {"limit": limit, "offset": limit * (page - 1)},
+        "cursor page 1": {"limit": limit, "cursor": ""},
+        f"cursor page {page}": {"limit": limit, "cursor": deep},
+    }
+
+    metrics = {}
+    for label, params in pages.items():
+        latencies = []
+        with count_queries() as queries:
+            for _ in range(50):
+                started = time.perf_counter()
+                call_view({"get": "list"}, "get", "/", user, params)
+                latencies.append(time.perf_counter() - started)
+        metrics[f"{label} p50 ms"] = percentile(latencies, 50)
+        metrics[f"{label} queries"] = len(queries) // 50
+    return metrics
+
+
+@scenario
+def catalog_cache(threads=16, requests=2000, **options):
+    """
+    Anonymous book list and detail reads with and without the response cache.
+
+    Uses the configured cache backend, so run it against Redis for numbers
+    that match production.
+    """
+    books = [seed_book(inventory=10, title=f"Catalog {i}") for i in range(50)]
+    list_view = BookViewSet.as_view({"get": "list"}, throttle_classes=())
+    detail_view = BookViewSet.as_view({"get": "retrieve"}, throttle_classes=())
+    counter = iter(range(10**9))
+
+    def read():
+        i = next(counter)
+        if i % 2:
+            list_view(factory.get("/", {"limit": 20, "offset": i % 3 * 20}))
+        else:
+            detail_view(factory.get("/"), pk=books[i % len(books)].id)
+
+    per_thread = max(requests // threads, 1)
+    metrics = {}
+    dummy = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    for label, caches in (("uncached", dummy), ("cached", None)):
+        catalog.stats.clear()
+        with override_settings(**({"CACHES": caches} if caches else {})):
+            started = time.perf_counter()
+            latencies = run_threads(read, threads, per_thread)
+            elapsed = time.perf_counter() - started
+        metrics[f"{label} requests/s"] = round(len(latencies) / elapsed, 1)
+        metrics[f"{label} p50 ms"] = percentile(latencies, 50)
+        metrics[f"{label} hits"] = catalog.stats["hits"]
+        metrics[f"{label} misses"] = catalog.stats["misses"]
+    return metrics
+
+
+@scenario
+def catalog_browse(threads=16, requests=2000, **options):
+    """
+    Anonymous catalog browsing: list pages by offset and cursor, and details.
+
+    The response cache is off so every request reaches the database; run
+    after ``--scale`` seeding to browse a production-sized catalog.
+    """
+    if Book.objects.count() < 1000:
+        Book.objects.bulk_create(
+            Book(
+                title=f"Browse {i}",
+                author=f"Author {i % 50}",
+                inventory=5,
+                cover=Cover.SOFT,
+                daily_fee=1,
+            )
+            for i in range(1000)
+        )
+        analyze(Book)
+    book_ids = list(Book.objects.values_list("id", flat=True)[:5000])
+    ordering = Book._meta.ordering
+    cursors = [
+        encode_cursor(book, ordering)
+        for book in Book.objects.order_by(*ordering)[: 20 * 50 : 20]
+    ]
+    list_view = BookViewSet.as_view({"get": "list"}, throttle_classes=())
+    detail_view = BookViewSet.as_view({"get": "retrieve"}, throttle_classes=())
+    counter = iter(range(10**9))
+
+    def browse():
+        i = next(counter)
+        if i % 3 == 0:
+            list_view(factory.get("/", {"limit": 20, "offset": i % 50 * 20}))
+        elif i % 3 == 1:
+            list_view(factory.get("/", {"limit": 20, "cursor": cursors[i % 50]}))
+        else:
+            detail_view(factory.get("/"), pk=book_ids[i % len(book_ids)])
+
+    dummy = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    queries = QueryCounter()
+    with override_settings(CACHES=dummy):
+        started = time.perf_counter()
+        latencies = run_threads(
+            browse, threads, max(requests // threads, 1), queries
+        )
+        elapsed = time.perf_counter() - started
+    metrics = {"catalog size": Book.objects.count()}
+    metrics.update(summarize(latencies, elapsed, queries))
+    return metrics
+
+
+def python_fee_totals(as_of):
+    """The per-row Python loop the fee engine replaces."""
+    totals = {}
+    for borrowing in Borrowing.objects.select_related("book").iterator(
+        chunk_size=5000
+    ):
+        returned = borrowing.actual_return_date or as_of
+        due = borrowing.expected_return_date
+        fee = borrowing.book.daily_fee
+        total = max((due - borrowing.borrow_date).days, 0) * fee + max(
+            (returned - due).days, 0
+        ) * fee * settings.FINE_MULTIPLIER
+        totals[borrowing.user_id] = totals.get(borrowing.user_id, 0) + total
+    return totals
+
+
+@scenario
+def fees(**options):
+    """Fee totals and a billing run over a million borrowings."""
+    rows = 1_000_000
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Fee {i}",
+            author="Benchmark Author",
+            inventory=0,
+            cover=Cover.SOFT,
+            daily_fee=1 + i % 5,
+        )
+        for i in range(100)
+    )
+    users = User.objects.bulk_create(
+        User(email=f"fees{i}@example.com") for i in range(1000)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Borrowing._meta.db_table} (
+                borrow_date, expected_return_date, actual_return_date,
+                book_id, user_id, updated_at
+            )
+            SELECT due - 14, due,
+                   CASE WHEN i %% 3 = 0 THEN NULL ELSE due + i %% 7 - 2 END,
+                   (%s::bigint[])[1 + i %% %s], (%s::bigint[])[1 + i %% %s], now()
+            FROM generate_series(1, %s) AS i,
+                 LATERAL (SELECT current_date - i %% 120 AS due) AS d
+            """,
+            [
+                [b.id for b in books], len(books),
+                [u.id for u in users], len(users),
+                rows,
+            ],
+        )
+    analyze(Borrowing, Book)
+    as_of = date.today()
+
+    started = time.perf_counter()
+    expected = python_fee_totals(as_of)
+    python_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    totals = {
+        row["user"]: row["total"] for row in Borrowing.objects.fee_totals(as_of)
+    }
+    sql_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    billed = billable_borrowings(as_of).bill(as_of)
+    billing_elapsed = time.perf_counter() - started
+
+    return {
+        "borrowings": rows,
+        "python per-user totals s": round(python_elapsed, 2),
+        "sql per-user totals s": round(sql_elapsed, 2),
+        "totals match": totals == expected,
+        "billing run charges": billed,
+        "billing run s": round(billing_elapsed, 2),
+    }
+
+
+@scenario
+def outbox(requests=2000, **options):
+    """
+    Checkout latency with the broker off the request path, then the relay.
+
+    Run with --live-broker to include the real publish cost, which now
+    lands in the relay instead of in the checkout request.
+    """
+    user = seed_user()
+    book = seed_book(inventory=requests)
+    payload = {
+        "book": book.id,
+        "expected_return_date": (date.today() + timedelta(days=7)).isoformat(),
+    }
+    latencies = run_threads(
+        lambda: call_view({"post": "create"}, "post", "/", user, payload),
+        1,
+        requests,
+    )
+    events = OutboxEvent.objects.count()
+
+    started = time.perf_counter()
+    relay_outbox()
+    relay = time.perf_counter() - started
+
+    return {
+        "checkout p50 ms": percentile(latencies, 50),
+        "checkout p99 ms": percentile(latencies, 99),
+        "outbox events written": events,
+        "relay events/s": round(events / relay, 1),
+        "relay ms per event": round(relay * 1000 / events, 3),
+    }
+
+
+@scenario
+def notification_batch(requests=2000, **options):
+    """Deliver ``requests`` notifications one per task, then in batches."""
+    user = seed_user()
+    book = seed_book(inventory=0)
+    due = date.today() - timedelta(days=1)
+
+    def seed_notifications():
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(user=user, book=book, expected_return_date=due)
+            for _ in range(requests)
+        )
+        return [
+            n.id
+            for n in Notification.objects.bulk_create(
+                Notification(type="OVERDUE", borrowing=b) for b in borrowings
+            )
+        ]
+
+    metrics = {}
+    ids = seed_notifications()
+    latencies = []
+    with count_queries() as queries:
+        started = time.perf_counter()
+        for pk in ids:
+            call_started = time.perf_counter()
+            send_notification(pk)
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+    metrics.update(summarize(latencies, elapsed, queries, "single task "))
+    metrics["single notifications/s"] = round(requests / elapsed, 1)
+    metrics["single queries/notification"] = round(len(queries) / requests, 2)
+
+    Notification.objects.all().delete()
+    ids = seed_notifications()
+    latencies = []
+    with count_queries() as queries:
+        started = time.perf_counter()
+        for start in range(0, len(ids), 500):
+            call_started = time.perf_counter()
+            send_notifications(ids[start:start + 500])
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+    metrics.update(summarize(latencies, elapsed, queries, "batch task "))
+    metrics["batched notifications/s"] = round(requests / elapsed, 1)
+    metrics["batched queries/notification"] = round(len(queries) / requests, 3)
+    return metrics
+
+
+@scenario
+def telegram(**options):
+    """
+    Broadcast to 5 admin chats through a local stub with 20 ms latency.
+
+    Compares the old per-message requests.post loop with the pooled,
+    concurrent client. Rate limits are lifted so only transport is measured.
+    """
+    chats, rounds = range(5), 40
+    metrics = {}
+
+    with TelegramStub(latency=0.02) as stub:
+        url = f"{stub.url}/botbench/sendMessage"
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for chat_id in chats:
+                requests.post(url, data={"chat_id": chat_id, "text": "x"}, timeout=5)
+        elapsed = time.perf_counter() - started
+        metrics["sequential messages/s"] = round(rounds * len(chats) / elapsed, 1)
+        metrics["sequential connections"] = stub.connections
+
+    with TelegramStub(latency=0.02) as stub:
+        client = TelegramClient(
+            "bench", api_url=stub.url, global_rate=10**6, chat_rate=10**6
+        )
+        started = time.perf_counter()
+        for _ in range(rounds):
+            client.broadcast(chats, "x")
+        elapsed = time.perf_counter() - started
+        client.close()
+        metrics["pooled messages/s"] = round(rounds * len(chats) / elapsed, 1)
+        metrics["pooled connections"] = stub.connections
+    return metrics
+
+
+@scenario
+def payments(requests=2000, **options):
+    """
+    The payment pipeline against a local Stripe stub with 20 ms latency.
+
+    Opens 400 Checkout sessions one at a time and through the pooled
+    client, again with 10% of Stripe requests failing, then delivers a
+    webhook event per payment and settles them with process_webhook_events.
+    """
+    sessions = 400
+    user = seed_user()
+    book = seed_book(inventory=0)
+    due = date.today() + timedelta(days=7)
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(user=user, book=book, expected_return_date=due)
+        for _ in range(max(requests, sessions))
+    )
+    ids = [
+        p.id
+        for p in Payment.objects.bulk_create(
+            Payment(borrowing=b, money_to_pay=7) for b in borrowings
+        )
+    ]
+    metrics = {}
+
+    def open_sessions(label, pool_size, **stub_options):
+        Payment.objects.update(session_id=None, session_url=None)
+        with StripeStub(latency=0.02, **stub_options) as stub:
+            client = PaymentClient(
+                "sk_bench", api_base=stub.url, pool_size=pool_size
+            )
+            with count_queries() as queries, mock.patch(
+                "library.tasks.get_payment_client", return_value=client
+            ):
+                started = time.perf_counter()
+                opened = sum(
+                    create_payment_sessions(ids[start:start + 100])
+                    for start in range(0, sessions, 100)
+                )
+                elapsed = time.perf_counter() - started
+            client.close()
+        metrics[f"{label} sessions/s"] = round(opened / elapsed, 1)
+        metrics[f"{label} stripe requests"] = len(stub.requests)
+        metrics[f"{label} duplicate sessions"] = len(stub.sessions) - opened
+        metrics[f"{label} left for sweep"] = sessions - opened
+        metrics[f"{label} queries/session"] = round(len(queries) / sessions, 3)
+        return stub
+
+    open_sessions("serial", pool_size=1)
+    open_sessions("pooled", pool_size=8)
+    stub = open_sessions("retried", pool_size=8, fail_next=sessions // 10)
+
+    with override_settings(STRIPE_WEBHOOK_SECRET=stub.webhook_secret):
+        view = StripeWebhookView.as_view()
+        session_ids = dict(
+            Payment.objects.filter(session_id__isnull=False).values_list(
+                "session_id", "id"
+            )
+        )
+        latencies = []
+        for session_id in session_ids:
+            payload = stub.completed_event(session_id)
+            request = factory.post(
+                "/", payload, content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=stub.sign(payload),
+            )
+            started = time.perf_counter()
+            view(request)
+            latencies.append(time.perf_counter() - started)
+
+    with count_queries() as queries:
+        started = time.perf_counter()
+        settled = process_webhook_events()
+        elapsed = time.perf_counter() - started
+    metrics["webhook p50 ms"] = percentile(latencies, 50)
+    metrics["webhook p99 ms"] = percentile(latencies, 99)
+    metrics["settled events/s"] = round(settled / elapsed, 1)
+    metrics["settle queries/event"] = round(len(queries) / settled, 3)
+    metrics["payments paid"] = Payment.objects.filter(status="PAID").count()
+    return metrics
+
+
+@scenario
+def metrics_overhead(requests=2000, **options):
+    """
+    What the metrics cost: recording one request, and one full scrape.
+
+    Records 100,000 requests over 20 views from 16 threads at once, then
+    renders the exposition with every collector, as the endpoint does.
+    """
+    recorder = Recorder()
+    recorder.count, recorder.db_time, recorder.wall_time = 3, 0.002, 0.015
+    views = [f"bench-view-{i}" for i in range(20)]
+    calls = 100_000
+    threads = 16
+    per_thread = calls // threads
+
+    def record():
+        for i in range(per_thread):
+            exposition.record_request(views[i % 20], "GET", 200, recorder)
+
+    started = time.perf_counter()
+    record()
+    serial = time.perf_counter() - started
+    started = time.perf_counter()
+    pool = [threading.Thread(target=record) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    contended = time.perf_counter() - started
+
+    user = seed_user()
+    book = seed_book(inventory=0)
+    due = date.today() - timedelta(days=1)
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(user=user, book=book, expected_return_date=due)
+        for _ in range(requests)
+    )
+    Notification.objects.bulk_create(
+        Notification(type="OVERDUE", borrowing=b) for b in borrowings
+    )
+    latencies = []
+    for _ in range(20):
+        with count_queries() as queries:
+            started = time.perf_counter()
+            body = exposition.render()
+            latencies.append(time.perf_counter() - started)
+    return {
+        "record_request us": round(serial / per_thread * 1e6, 3),
+        "record_request 16 threads us": round(
+            contended / (per_thread * threads) * 1e6, 3
+        ),
+        "scrape p50 ms": percentile(latencies, 50),
+        "scrape queries": len(queries),
+        "scrape bytes": len(body),
+    }
+
+
+@scenario
+def renderers(**options):
+    """
+    Render time and size of book and borrowing list pages per renderer.
+
+    Pages of 100 rows, rendered 2,000 times each by DRF's JSONRenderer,
+    ORJSONRenderer and MessagePackRenderer.
+    """
+    user = seed_user()
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Renderer Book {i}",
+            author="Benchmark Author",
+            inventory=1,
+            cover=Cover.HARD,
+            daily_fee=1,
+        )
+        for i in range(100)
+    )
+    due = date.today() + timedelta(days=7)
+    Borrowing.objects.bulk_create(
+        Borrowing(user=user, book=book, expected_return_date=due) for book in books
+    )
+    payloads = {
+        "books": BookListSerializer(books, many=True).data,
+        "borrowings": BorrowingListSerializer(
+            Borrowing.objects.select_related("book", "user")[:100], many=True
+        ).data,
+    }
+    candidates = [
+        ("json", JSONRenderer()),
+        ("orjson", ORJSONRenderer()),
+        ("msgpack", MessagePackRenderer()),
+    ]
+
+    metrics = {}
+    for payload, data in payloads.items():
+        for label, renderer in candidates:
+            started = time.perf_counter()
+            for _ in range(2000):
+                body = renderer.render(data)
+            elapsed = time.perf_counter() - started
+            metrics[f"{payload} {label} us/page"] = round(elapsed / 2000 * 1e6, 1)
+            metrics[f"{payload} {label} bytes"] = len(body)
+    return metrics
+
+
+@scenario
+def list_columns(**options):
+    """
+    Book and borrowing list pages of 5, 100 and 1,000 rows, built from model
+    instances by the serializer and from column tuples, rendered to JSON.
+    """
+    user = seed_user()
+    user.is_staff = True
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Column Book {i}",
+            author="Benchmark Author",
+            inventory=1,
+            cover=Cover.HARD,
+            daily_fee=1,
+        )
+        for i in range(1000)
+    )
+    Borrowing.objects.bulk_create(
+        Borrowing(
+            user=user,
+            book=book,
+            expected_return_date=date.today() + timedelta(days=i % 30),
+        )
+        for i, book in enumerate(books)
+    )
+    analyze(Book, Borrowing)
+    calls = {5: 400, 100: 100, 1000: 20}
+    dummy = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+    metrics = {}
+    with override_settings(CACHES=dummy):
+        for name, viewset in (("books", BookViewSet), ("borrowings", BorrowingViewSet)):
+            for label, from_columns in (("serializer", False), ("columns", True)):
+                view = viewset.as_view(
+                    {"get": "list"},
+                    throttle_classes=(),
+                    list_from_columns=from_columns,
+                )
+                for limit, count in calls.items():
+                    started = time.perf_counter()
+                    for _ in range(count):
+                        request = factory.get("/", {"limit": limit})
+                        force_authenticate(request, user=user)
+                        view(request).render()
+                    elapsed = time.perf_counter() - started
+                    metrics[f"{name} {limit} rows {label} requests/s"] = round(
+                        count / elapsed, 1
+                    )
+    return metrics
+
+
+def wsgi_environ(path, query, token):
+    return {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_AUTHORIZATION": f"Bearer {token}",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.url_scheme": "http",
+    }
+
+
+async def asgi_get(handler, path, query, token):
+    """Serve one GET through ``handler`` as an ASGI server would; return the status."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [
+            (b"host", b"localhost"),
+            (b"authorization", f"Bearer {token}".encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    received = False
+    status = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client stays connected until the response is sent.
+        await asyncio.Future()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await handler(scope, receive, send)
+    return status[0]
+
+
+@scenario
+def asgi_vs_wsgi(threads=16, requests=2000, **options):
+    """
+    Book and borrowing lists, borrowing details and ``me`` under WSGI and ASGI.
+
+    WSGI is a pool of ``threads`` workers calling the sync views; ASGI is
+    one event loop calling the async views. Every query is delayed by
+    ``latency_ms`` to stand in for a database across the network. Clients
+    go up to four times the pool; every ASGI request in flight holds a
+    database connection, so keep that under Postgres' max_connections.
+    """
+    latency_ms = 50
+    user = seed_user()
+    token = str(AccessToken.for_user(user))
+    books = [seed_book(inventory=10, title=f"Async {i}") for i in range(20)]
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(
+            user=user,
+            book=book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        for book in books
+    )
+    calls = [
+        ("/api/library/books/", "limit=20"),
+        ("/api/library/borrowings/", "limit=20"),
+        *((f"/api/library/borrowings/{b.id}/", "") for b in borrowings[:5]),
+        ("/api/user/me/", ""),
+    ]
+    queries = QueryCounter()
+
+    def slow_database(execute, sql, params, many, context):
+        time.sleep(latency_ms / 1000)
+        return queries(execute, sql, params, many, context)
+
+    def add_latency(sender, connection, **kwargs):
+        # A thread's connection object is reused across reconnects.
+        if slow_database not in connection.execute_wrappers:
+            connection.execute_wrappers.append(slow_database)
+
+    def run_wsgi(clients, per_client):
+        handler = WSGIHandler()
+        workers = threading.BoundedSemaphore(threads)
+        counter = iter(range(10**9))
+        statuses = []
+
+        def get():
+            path, query = calls[next(counter) % len(calls)]
+            with workers:
+                handler(
+                    wsgi_environ(path, query, token),
+                    lambda status, headers: statuses.append(status[:3]),
+                )
+
+        latencies = run_threads(get, clients, per_client)
+        return latencies, statuses
+
+    async def run_asgi(clients, per_client):
+        handler = ASGIHandler()
+        latencies, statuses = [], []
+
+        async def client(offset):
+            for i in range(per_client):
+                path, query = calls[(offset + i) % len(calls)]
+                started = time.perf_counter()
+                statuses.append(str(await asgi_get(handler, path, query, token)))
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(client(n) for n in range(clients)))
+        return latencies, statuses
+
+    dummy = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    unthrottled = {"anon": None, "user": None}
+    connection_created.connect(add_latency)
+    metrics = {"db latency ms": latency_ms}
+    try:
+        with override_settings(
+            CACHES=dummy, SLOW_REQUEST_MS=10**6
+        ), mock.patch.dict(UserRateThrottle.THROTTLE_RATES, unthrottled):
+            connections.close_all()
+            for clients in (threads, threads * 4):
+                per_client = max(requests // 4 // clients, 1)
+                for label, urlconf in (
+                    ("wsgi", "library_service_api.urls"),
+                    ("asgi", "library_service_api.asgi_urls"),
+                ):
+                    queries.count = 0
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        started = time.perf_counter()
+                        if label == "wsgi":
+                            latencies, statuses = run_wsgi(clients, per_client)
+                        else:
+                            latencies, statuses = asyncio.run(
+                                run_asgi(clients, per_client)
+                            )
+                        elapsed = time.perf_counter() - started
+                    metrics.update(
+                        summarize(
+                            latencies, elapsed, queries, f"{clients} clients {label} "
+                        )
+                    )
+                    metrics[f"{clients} clients {label} errors"] = sum(
+                        status != "200" for status in statuses
+                    )
+    finally:
+        connection_created.disconnect(add_latency)
+        connections.close_all()
+    return metrics
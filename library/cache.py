@@ -0,0 +1,120 @@
+"""
+Response cache for the public book catalog.
+
+Detail entries are keyed by book id and dropped whenever that book changes.
+List entries are keyed by scheme, host and query string, since their
+pagination links are absolute, under a version number that is bumped when
+a book is added, edited or deleted; inventory changes leave the lists
+alone because list pages do not show inventory.
+Invalidation runs after commit, and ``CATALOG_CACHE_TIMEOUT`` bounds how
+long an entry can survive a lost race with a concurrent reader.
+"""
+import time
+from collections import Counter
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from library.conditional import conditional_response
+
+
+LIST_VERSION_KEY = "catalog:list:version"
+
+stats = Counter()
+
+
+def list_key(request):
+    version = cache.get_or_set(LIST_VERSION_KEY, time.time_ns, timeout=None)
+    return versioned_list_key(request, version)
+
+
+async def alist_key(request):
+    version = await cache.aget_or_set(LIST_VERSION_KEY, time.time_ns, timeout=None)
+    return versioned_list_key(request, version)
+
+
+def versioned_list_key(request, version):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    origin = f"{request.scheme}://{request.get_host()}"
+    return f"catalog:list:{version}:{origin}:{query}"
+
+
+def detail_key(pk):
+    return f"catalog:book:{pk}"
+
+
+def cached_response(request, key, render):
+    """
+    Serve ``key`` from the cache, or call ``render`` and cache a 200.
+
+    Entries keep the response's validators, so a hit still answers
+    conditional requests with a 304.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        return hit(request, entry)
+
+    stats["misses"] += 1
+    response = render()
+    if response.status_code == 200:
+        cache.set(key, entry_of(response), settings.CATALOG_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+async def acached_response(request, key, render):
+    """cached_response for async views; ``render`` is a coroutine function."""
+    entry = await cache.aget(key)
+    if entry is not None:
+        return hit(request, entry)
+
+    stats["misses"] += 1
+    response = await render()
+    if response.status_code == 200:
+        await cache.aset(key, entry_of(response), settings.CATALOG_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def hit(request, entry):
+    stats["hits"] += 1
+    data, etag, last_modified = entry
+    response = conditional_response(
+        request, etag, last_modified, lambda: Response(data)
+    )
+    response["X-Cache"] = "HIT"
+    return response
+
+
+def entry_of(response):
+    return (
+        response.data,
+        response["ETag"],
+        parse_http_date_safe(response.get("Last-Modified")),
+    )
+
+
+def drop(book_ids, listed):
+    cache.delete_many([detail_key(pk) for pk in book_ids])
+    if listed:
+        try:
+            cache.incr(LIST_VERSION_KEY)
+        except ValueError:
+            # Evicted: start from a version no cached list page can carry.
+            cache.set(LIST_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_books(book_ids, listed=False):
+    """
+    Drop the cached entries of ``book_ids`` once the transaction commits.
+
+    Pass ``listed=True`` when a change is visible on list pages too.
+    """
+    book_ids = list(book_ids)
+    if book_ids or listed:
+        transaction.on_commit(partial(drop, book_ids, listed))
@@ -0,0 +1,106 @@
+"""Scrape-time gauges for the metrics endpoint; see library.metrics."""
+from django.db import connection, connections
+from django.db.models import Count
+
+from library import cache, metrics
+from library.models import Notification, OutboxEvent, WebhookEvent
+from library_service_api.celery import app
+
+
+@metrics.collector
+def notification_backlog():
+    """Undelivered notifications by status, read through the unsent index."""
+    counts = dict.fromkeys(("PENDING", "SENDING", "FAILED"), 0)
+    counts.update(
+        Notification.objects.exclude(status="SENT")
+        .order_by()
+        .values_list("status")
+        .annotate(count=Count("id"))
+    )
+    return metrics.gauge(
+        "library_notifications_unsent",
+        "Notifications not yet delivered, by status.",
+        [((status,), count) for status, count in sorted(counts.items())],
+        ["status"],
+    )
+
+
+@metrics.collector
+def pipeline_backlog():
+    return metrics.gauge(
+        "library_outbox_events",
+        "Outbox events waiting for relay_outbox.",
+        [((), OutboxEvent.objects.count())],
+    ) + metrics.gauge(
+        "library_webhook_events_unprocessed",
+        "Stripe events waiting for process_webhook_events.",
+        [((), WebhookEvent.objects.filter(processed_at__isnull=True).count())],
+    )
+
+
+@metrics.collector
+def database_connections():
+    """Open connections of this process, and of the whole database by state."""
+    lines = metrics.gauge(
+        "library_db_connections_open",
+        "Database connections held open by this process.",
+        [
+            (
+                (),
+                sum(
+                    conn.connection is not None
+                    for conn in connections.all(initialized_only=True)
+                ),
+            )
+        ],
+    )
+    if connection.vendor != "postgresql":
+        return lines
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT coalesce(state, 'unknown'), count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() GROUP BY 1 ORDER BY 1"
+        )
+        rows = cursor.fetchall()
+    return lines + metrics.gauge(
+        "library_db_server_connections",
+        "Connections to the database from every client, by state.",
+        [((state,), count) for state, count in rows],
+        ["state"],
+    )
+
+
+@metrics.collector
+def catalog_cache():
+    return [
+        "# HELP library_catalog_cache_requests_total "
+        "Catalog response cache lookups by result.",
+        "# TYPE library_catalog_cache_requests_total counter",
+        *(
+            f'library_catalog_cache_requests_total{{result="{result}"}} '
+            f"{cache.stats[key]}"
+            for result, key in (("hit", "hits"), ("miss", "misses"))
+        ),
+    ]
+
+
+@metrics.collector
+def celery_queue():
+    """Messages waiting in the default Celery queue."""
+    queue = app.conf.task_default_queue
+    with app.connection_for_read() as conn:
+        conn.ensure_connection(max_retries=1)
+        _, depth, consumers = conn.default_channel.queue_declare(
+            queue=queue, passive=True
+        )
+    return metrics.gauge(
+        "library_celery_queue_depth",
+        "Messages waiting in the Celery queue.",
+        [((queue,), depth)],
+        ["queue"],
+    ) + metrics.gauge(
+        "library_celery_queue_consumers",
+        "Workers consuming from the Celery queue.",
+        [((queue,), consumers)],
+        ["queue"],
+    )
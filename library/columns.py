@@ -0,0 +1,66 @@
+"""
+Serializer-free list pages.
+
+A ModelSerializer builds a model instance and walks its field tree for
+every row. When every field of a list serializer reads a plain column,
+possibly across foreign keys, the page can be fetched as named tuples of
+just those columns instead, and each value formatted with its field's own
+``to_representation``. The output is exactly what the serializer would
+produce, and the serializer class still describes the response in the
+OpenAPI schema.
+"""
+from library.pagination import keyset_ordering
+
+
+def column_fields(serializer):
+    """``(output name, column lookup, to_representation)`` per readable field."""
+    return [
+        (name, field.source.replace(".", "__"), field.to_representation)
+        for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+
+
+def column_rows(queryset, serializer):
+    """
+    ``queryset`` as named tuples of the columns ``serializer`` reads.
+
+    The id, ``updated_at`` and sort key columns come along for the ETag
+    and keyset cursors, and so does the ``updated_at`` of every joined
+    table that has one, for Last-Modified.
+    """
+    columns = [column for _, column, _ in column_fields(serializer)]
+    columns += ["id", "updated_at"]
+    columns += [
+        f"{relation}__updated_at"
+        for relation in joined_relations(columns)
+        if has_updated_at(queryset.model, relation)
+    ]
+    columns += [field.lstrip("-") for field in keyset_ordering(queryset)]
+    return queryset.values_list(*dict.fromkeys(columns), named=True)
+
+
+def joined_relations(columns):
+    return dict.fromkeys(
+        column.rpartition("__")[0] for column in columns if "__" in column
+    )
+
+
+def has_updated_at(model, relation):
+    for name in relation.split("__"):
+        model = model._meta.get_field(name).related_model
+    return any(field.name == "updated_at" for field in model._meta.fields)
+
+
+def representer(serializer):
+    """Return a function that formats a row of column_rows like ``serializer``."""
+    fields = column_fields(serializer)
+
+    def represent(row):
+        data = {}
+        for name, column, to_representation in fields:
+            value = getattr(row, column)
+            data[name] = None if value is None else to_representation(value)
+        return data
+
+    return represent
@@ -0,0 +1,176 @@
+"""
+Conditional GET support for the library viewsets.
+
+Validators are computed from the rows a response is built from, their ids
+and ``updated_at`` plus the collection count in offset mode, before the
+serializer runs. Rows built from columns (library.columns) also carry the
+columns they read from joined tables, and those go into the ETag too. A
+client that already holds the current representation gets a 304 for the
+price of the page query alone.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from library import columns
+
+
+def row_version(row):
+    """
+    Return what identifies the version of ``row`` and when it last changed.
+
+    A model instance is identified by its id and ``updated_at``. A column
+    row is identified by all of its values, since a joined table can change
+    without the row's own ``updated_at`` moving. It changed at the latest of
+    its ``updated_at`` columns, or at an unknown time (None) when it reads a
+    joined table without one.
+    """
+    if not hasattr(row, "_fields"):
+        return f"{row.id}:{row.updated_at.isoformat()}", row.updated_at
+
+    changed = []
+    for name in row._fields:
+        relation, _, column = name.rpartition("__")
+        if column == "updated_at":
+            changed.append(getattr(row, name))
+        elif relation and f"{relation}__updated_at" not in row._fields:
+            return repr(tuple(row)), None
+    return repr(tuple(row)), max(filter(None, changed), default=None)
+
+
+def validators(request, rows, count=None, salt=""):
+    """
+    Return the ``(etag, last_modified timestamp)`` of a response of ``rows``.
+
+    There is no Last-Modified when one of the rows cannot tell when it
+    last changed.
+    """
+    key = f"{request.get_full_path()}|{request.accepted_media_type}|{count}|{salt}"
+    digest = hashlib.md5(key.encode(), usedforsecurity=False)
+    last_modified, dated = None, True
+    for row in rows:
+        version, changed = row_version(row)
+        digest.update(f"|{version}".encode())
+        if changed is None:
+            dated = False
+        elif last_modified is None or changed > last_modified:
+            last_modified = changed
+    return (
+        quote_etag(digest.hexdigest()),
+        int(last_modified.timestamp()) if last_modified and dated else None,
+    )
+
+
+def conditional_response(request, etag, last_modified, render):
+    """Answer with 304 if the client's validators match, else call ``render``."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """Serve ``list`` and ``retrieve`` with ETag / Last-Modified validators."""
+
+    # Build list pages from column tuples with library.columns instead of
+    # model instances and the serializer. Needs KeysetPagination.
+    list_from_columns = False
+
+    def get_validator_salt(self):
+        """Extra input to the ETag for representations that change on their own."""
+        return ""
+
+    def list(self, request, *args, **kwargs):
+        queryset, counted, represent = self.list_source()
+        if counted is None:
+            page = self.paginate_queryset(queryset)
+        else:
+            page = self.paginator.paginate_queryset(
+                queryset, request, view=self, count_queryset=counted
+            )
+        rows = list(queryset) if page is None else page
+        return self.list_response(request, page, rows, represent)
+
+    async def alist(self, request, *args, **kwargs):
+        """``list`` on the async ORM; needs KeysetPagination too."""
+        queryset, counted, represent = self.list_source()
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(
+                queryset, request, view=self, count_queryset=counted
+            )
+        rows = [row async for row in queryset] if page is None else page
+        return self.list_response(request, page, rows, represent)
+
+    def list_source(self):
+        """
+        Return the rows to list, the queryset to count (None for the rows
+        themselves) and the function that represents a page of rows.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if not self.list_from_columns:
+            return (
+                queryset,
+                None,
+                lambda rows: self.get_serializer(rows, many=True).data,
+            )
+        serializer = self.get_serializer()
+        represent = columns.representer(serializer)
+        return (
+            columns.column_rows(queryset, serializer),
+            queryset,
+            lambda rows: [represent(row) for row in rows],
+        )
+
+    def list_response(self, request, page, rows, represent):
+        def render():
+            data = represent(rows)
+            if page is None:
+                return Response(data)
+            return self.get_paginated_response(data)
+
+        count = getattr(self.paginator, "count", None)
+        etag, last_modified = validators(
+            request, rows, count, self.get_validator_salt()
+        )
+        return conditional_response(request, etag, last_modified, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.retrieve_response(request, self.get_object())
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return self.retrieve_response(request, await self.aget_object())
+
+    async def aget_object(self):
+        """GenericAPIView.get_object on the async ORM."""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            instance = await aget_object_or_404(queryset, **filter_kwargs)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def retrieve_response(self, request, instance):
+        etag, last_modified = validators(
+            request, [instance], salt=self.get_validator_salt()
+        )
+        return conditional_response(
+            request,
+            etag,
+            last_modified,
+            lambda: Response(self.get_serializer(instance).data),
+        )
@@ -0,0 +1,168 @@
+"""
+SQL and latency instrumentation for requests and Celery tasks.
+
+A Recorder counts queries, sums their time and keeps the slowest few.
+Recorders are found through a context variable by an execute wrapper on
+every database connection, so queries the async ORM runs in worker
+threads are recorded with the request that made them.
+QueryTimingMiddleware reports the numbers on every response in a
+``Server-Timing`` header, and InstrumentedTask records every task run.
+Both log runs over ``SLOW_REQUEST_MS`` / ``SLOW_TASK_MS`` with their worst
+queries to the ``library.performance`` logger, and feed library.metrics.
+"""
+import heapq
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import Task
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from library import metrics
+
+
+logger = logging.getLogger("library.performance")
+
+# The recorders of the running request or task, outermost first.
+recorders = ContextVar("recorders", default=())
+
+
+class Recorder:
+    def __init__(self, keep=3):
+        self.keep = keep
+        self.count = 0
+        self.db_time = 0.0
+        self.wall_time = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.db_time += duration
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, (duration, sql))
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (duration, sql))
+
+    def worst_queries(self):
+        """The slowest queries seen, as ``(seconds, sql)``, slowest first."""
+        return sorted(self.slowest, reverse=True)
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.count} queries", '
+            f"total;dur={self.wall_time * 1000:.2f}"
+        )
+
+    def log_if_slow(self, label, threshold_ms):
+        if self.wall_time * 1000 < threshold_ms:
+            return
+        lines = [
+            f"Slow {label}: {self.wall_time * 1000:.1f} ms, {self.count} queries "
+            f"in {self.db_time * 1000:.1f} ms"
+        ]
+        lines.extend(
+            f"  {duration * 1000:.1f} ms: {sql}"
+            for duration, sql in self.worst_queries()
+        )
+        logger.warning("\n".join(lines))
+
+
+def dispatch(execute, sql, params, many, context):
+    """Execute wrapper that hands each query to the active recorders."""
+    for recorder in reversed(recorders.get()):
+        execute = partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch)
+
+
+connection_created.connect(install)
+
+
+@contextmanager
+def record():
+    """Record the queries and wall time of the block, in this context."""
+    recorder = Recorder(keep=settings.SLOW_QUERIES_LOGGED)
+    # Connections opened before this module was imported missed the signal.
+    install(connection)
+    token = recorders.set((*recorders.get(), recorder))
+    started = time.perf_counter()
+    try:
+        yield recorder
+    finally:
+        recorder.wall_time = time.perf_counter() - started
+        recorders.reset(token)
+
+
+class QueryTimingMiddleware:
+    """Add ``Server-Timing`` to every response and log slow requests."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with record() as recorder:
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        with record() as recorder:
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        timing = recorder.server_timing()
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+        match = request.resolver_match
+        metrics.record_request(
+            match.view_name if match else "<unmatched>",
+            request.method,
+            response.status_code,
+            recorder,
+        )
+        recorder.log_if_slow(
+            f"request {request.method} {request.get_full_path()} "
+            f"({response.status_code})",
+            settings.SLOW_REQUEST_MS,
+        )
+        return response
+
+
+class InstrumentedTask(Task):
+    """Celery task base class that records and logs every run like a request."""
+
+    def __call__(self, *args, **kwargs):
+        try:
+            with record() as recorder:
+                return super().__call__(*args, **kwargs)
+        finally:
+            metrics.record_task(self.name, recorder)
+            recorder.log_if_slow(f"task {self.name}", settings.SLOW_TASK_MS)
+
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        metrics.task_retries.inc(self.name)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        metrics.task_failures.inc(self.name)
@@ -0,0 +1,163 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from unittest import mock
+
+from celery.app.task import Task
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+from library.benchmarks import SCENARIOS, compare
+from library.seeding import seed_library
+
+
+class Command(BaseCommand):
+    help = "Run performance scenarios against a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            choices=sorted(SCENARIOS),
+            help="Scenarios to run (default: all).",
+        )
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Reuse the benchmark database between runs.",
+        )
+        parser.add_argument(
+            "--live-broker",
+            action="store_true",
+            help="Publish Celery tasks instead of counting them locally.",
+        )
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=0,
+            help=(
+                "Seed background data first: 1.0 is 100k books, 50k users "
+                "and 1M borrowings (default: none)."
+            ),
+        )
+        parser.add_argument(
+            "--json",
+            metavar="PATH",
+            help="Write the results to PATH, for use as a --compare baseline.",
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="PATH",
+            help="Compare the results with a baseline written by --json.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=20,
+            help="Percent a metric may worsen before it counts as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        names = options["scenarios"] or sorted(SCENARIOS)
+        baseline = self.load_baseline(options["compare"])
+        creation = connections["default"].creation
+        old_name = creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        published = []
+        patcher = mock.patch.object(
+            Task,
+            "apply_async",
+            lambda task, *a, **kw: published.append(task.name),
+        )
+        if not options["live_broker"]:
+            patcher.start()
+        results = {}
+        try:
+            if options["scale"]:
+                self.seed(options["scale"])
+            for name in names:
+                published.clear()
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                metrics = SCENARIOS[name](**options)
+                if not options["live_broker"]:
+                    metrics["tasks published"] = len(published)
+                for key, value in metrics.items():
+                    self.stdout.write(f"  {key:<40} {value}")
+                results[name] = metrics
+        finally:
+            if not options["live_broker"]:
+                patcher.stop()
+            creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+
+        if options["json"]:
+            self.write_results(options, results)
+        if baseline is not None:
+            self.report(baseline, results, options["tolerance"])
+
+    def seed(self, scale):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"seeding (scale {scale})"))
+        try:
+            inserted = seed_library(
+                books=int(100_000 * scale),
+                users=int(50_000 * scale),
+                borrowings=int(1_000_000 * scale),
+            )
+        except ImproperlyConfigured as exc:
+            raise CommandError(exc)
+        for table, rows in inserted.items():
+            self.stdout.write(f"  {table:<40} {rows}")
+
+    def load_baseline(self, path):
+        if not path:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)["scenarios"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot read baseline {path}: {exc}")
+
+    def write_results(self, options, results):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        except OSError:
+            commit = ""
+        document = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": commit or None,
+            "python": platform.python_version(),
+            "options": {
+                key: options[key] for key in ("threads", "requests", "scale")
+            },
+            "scenarios": results,
+        }
+        with open(options["json"], "w") as f:
+            json.dump(document, f, indent=2, default=str)
+        self.stdout.write(f"Results written to {options['json']}")
+
+    def report(self, baseline, results, tolerance):
+        self.stdout.write(self.style.MIGRATE_HEADING("compared with baseline"))
+        regressions = []
+        for name, metric, old, new, change, regressed in compare(
+            baseline, results, tolerance
+        ):
+            line = f"  {name}: {metric:<40} {old} -> {new} ({change:+.1f}%)"
+            if regressed:
+                regressions.append(line)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} metrics regressed by more than "
+                f"{tolerance:g}%:\n" + "\n".join(regressions)
+            )
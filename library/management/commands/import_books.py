@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library.cache import invalidate_books
+from library.models import Book
+
+
+FIELDS = ("title", "author", "inventory", "cover", "daily_fee")
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, row dict)`` pairs from a CSV or JSON-lines stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except ValueError:
+            yield line_num, line.rstrip("\n")
+
+
+def clean_row(row):
+    """Validate ``row`` against the Book fields; return ``(values, errors)``."""
+    if not isinstance(row, dict):
+        return None, {"row": ["Not a JSON object."]}
+
+    values, errors = {}, {}
+    pk = row.get("id")
+    if pk not in (None, ""):
+        try:
+            values["id"] = Book._meta.pk.clean(pk, None)
+        except ValidationError as exc:
+            errors["id"] = exc.messages
+    for name in FIELDS:
+        field = Book._meta.get_field(name)
+        raw = row.get(name)
+        if raw in (None, "") and field.has_default():
+            raw = field.get_default()
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    return values, errors
+
+
+def reset_sequence():
+    """Move the id sequence past the highest id, explicit ones included."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Book]):
+            cursor.execute(sql)
+
+
+def copy_books(rows, now):
+    """Insert ``rows`` with a single COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[name] for name in FIELDS] + [now.isoformat()])
+    buffer.seek(0)
+    columns = ", ".join(FIELDS + ("updated_at",))
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {Book._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream books from a CSV or JSON-lines file into the catalog. "
+        "Rows with an id update that book, other rows are inserted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON-lines file to import.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format (default: from the file extension).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate every row without writing to the database.",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="Write rejected rows with their errors to this JSON-lines file.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        use_copy = connection.vendor == "postgresql" and not options["dry_run"]
+        rejects = open(options["rejects"], "w") if options["rejects"] else None
+        imported = rejected = 0
+        started = time.perf_counter()
+
+        try:
+            with open(path, newline="") as stream:
+                rows = read_rows(stream, fmt)
+                while batch := list(islice(rows, options["batch_size"])):
+                    valid = []
+                    for line_num, row in batch:
+                        values, errors = clean_row(row)
+                        if errors:
+                            rejected += 1
+                            self.reject(rejects, line_num, row, errors)
+                        else:
+                            valid.append(values)
+
+                    if not options["dry_run"]:
+                        self.write_batch(valid, use_copy)
+                    imported += len(valid)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{imported + rejected} rows read, {imported} valid, "
+                        f"{rejected} rejected ({imported / elapsed:.0f} rows/s)"
+                    )
+        except (OSError, csv.Error) as exc:
+            raise CommandError(exc)
+        finally:
+            if rejects:
+                rejects.close()
+
+        elapsed = time.perf_counter() - started
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {imported} books, rejected {rejected}, in {elapsed:.1f}s "
+                f"({imported / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+
+    def reject(self, rejects, line_num, row, errors):
+        if rejects:
+            record = {"line": line_num, "row": row, "errors": errors}
+            rejects.write(json.dumps(record, default=str) + "\n")
+
+    def write_batch(self, rows, use_copy):
+        """
+        Upsert the rows with an id, then insert the others.
+
+        A batch can hold only one row per id, so the last one wins. Rows
+        with explicit ids do not advance the id sequence; it is moved past
+        them before the other rows draw their ids from it.
+        """
+        if not rows:
+            return
+        now = timezone.now()
+        updates = {
+            row["id"]: Book(**row, updated_at=now) for row in rows if "id" in row
+        }
+        inserts = [row for row in rows if "id" not in row]
+
+        with transaction.atomic():
+            if updates:
+                Book.objects.bulk_create(
+                    updates.values(),
+                    update_conflicts=True,
+                    unique_fields=["id"],
+                    update_fields=FIELDS + ("updated_at",),
+                )
+                reset_sequence()
+            if inserts and use_copy:
+                copy_books(inserts, now)
+            elif inserts:
+                Book.objects.bulk_create(
+                    Book(**row, updated_at=now) for row in inserts
+                )
+            invalidate_books(list(updates), listed=True)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import BaseCommand, CommandError
+
+from library.seeding import seed_library
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with generated users, books and borrowings for "
+        "load tests. Rows are generated in SQL and added to existing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=50_000)
+        parser.add_argument("--borrowings", type=int, default=1_000_000)
+        parser.add_argument(
+            "--seed",
+            type=float,
+            default=0.42,
+            help="Random seed between -1 and 1; equal seeds give equal data.",
+        )
+        parser.add_argument("--batch-size", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        if not -1 <= options["seed"] <= 1:
+            raise CommandError("--seed must be between -1 and 1.")
+        started = time.perf_counter()
+
+        def progress(table, done, total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{table}: {done}/{total} ({elapsed:.1f}s)")
+
+        try:
+            inserted = seed_library(
+                books=options["books"],
+                users=options["users"],
+                borrowings=options["borrowings"],
+                seed=options["seed"],
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        except ImproperlyConfigured as exc:
+            raise CommandError(exc)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {inserted['users']} users, {inserted['books']} books "
+                f"and {inserted['borrowings']} borrowings in {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,239 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters and histograms live in this process's memory and are updated with
+one lock and a dict lookup each; a request makes four such updates, a few
+microseconds in all. Values that are cheap to read but costly to track, such as the
+Notification backlog or the broker queue depth, are gathered by collectors
+when the metrics are scraped.
+
+Each process exposes its own series: API processes at the staff-only
+``/api/metrics/`` endpoint, Celery worker processes on an HTTP port of
+their own when ``WORKER_METRICS_PORT`` is set.
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+registry = []
+collectors = []
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum.
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels):
+        series = self.values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.values.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = format_labels(
+                    self.labels, key, [("le", format_value(float(bound)))]
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def gauge(name, documentation, samples, labels=()):
+    """Exposition lines of a gauge computed at scrape time."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    lines.extend(
+        f"{name}{format_labels(labels, key)} {format_value(value)}"
+        for key, value in samples
+    )
+    return lines
+
+
+def collector(func):
+    """Register ``func``, which returns gauge lines, to run on every scrape."""
+    collectors.append(func)
+    return func
+
+
+def render(collect=True):
+    """
+    This process's metrics in the Prometheus text format.
+
+    With ``collect``, the scrape-time collectors run too; a collector that
+    fails is skipped so one broken source does not hide the others.
+    """
+    lines = []
+    for metric in registry:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    if collect:
+        for func in collectors:
+            try:
+                lines.extend(func())
+            except Exception:
+                continue
+    return "\n".join(lines) + "\n"
+
+
+http_requests = Counter(
+    "library_http_requests_total",
+    "HTTP requests by view, method and status code.",
+    ["view", "method", "status"],
+)
+http_latency = Histogram(
+    "library_http_request_duration_seconds",
+    "Wall time of HTTP requests by view.",
+    ["view", "method"],
+)
+db_queries = Counter(
+    "library_db_queries_total",
+    "SQL queries run, by the view or task that ran them.",
+    ["source"],
+)
+db_time = Counter(
+    "library_db_query_seconds_total",
+    "Time spent in SQL queries, by the view or task that ran them.",
+    ["source"],
+)
+task_latency = Histogram(
+    "library_celery_task_duration_seconds",
+    "Run time of Celery tasks.",
+    ["task"],
+    buckets=TASK_BUCKETS,
+)
+task_retries = Counter(
+    "library_celery_task_retries_total", "Celery task retries.", ["task"]
+)
+task_failures = Counter(
+    "library_celery_task_failures_total", "Celery tasks that raised.", ["task"]
+)
+
+notification_deliveries = Counter(
+    "library_notification_deliveries_total",
+    "Notification delivery attempts by type and outcome; retried marks "
+    "attempts after the first.",
+    ["type", "result", "retried"],
+)
+
+
+def record_request(view, method, status, recorder):
+    http_requests.inc(view, method, status)
+    http_latency.observe(recorder.wall_time, view, method)
+    db_queries.inc(view, amount=recorder.count)
+    db_time.inc(view, amount=recorder.db_time)
+
+
+def record_task(task, recorder):
+    task_latency.observe(recorder.wall_time, task)
+    db_queries.inc(task, amount=recorder.count)
+    db_time.inc(task, amount=recorder.db_time)
+
+
+def serve(port):
+    """Expose this process's metrics on ``port`` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render(collect=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def worker_port(index):
+    """The metrics port of the worker child process with ``index``."""
+    return settings.WORKER_METRICS_PORT + index
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:15
+
+import library.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0007_borrowing_notification_indexes"),
+    ]
+
+    operations = [
+        # Keep one notification per (type, borrowing), preferring a sent one.
+        migrations.RunSQL(
+            """
+            DELETE FROM library_notification
+            WHERE borrowing_id IS NOT NULL AND id NOT IN (
+                SELECT DISTINCT ON (type, borrowing_id) id
+                FROM library_notification
+                WHERE borrowing_id IS NOT NULL
+                ORDER BY type, borrowing_id, status = 'SENT' DESC, id DESC
+            )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="leased_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                default=library.models.lease_deadline,
+                help_text="The dispatcher leaves the row alone until then.",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("SENDING", "Sending"),
+                    ("SENT", "Sent"),
+                    ("FAILED", "Failed"),
+                ],
+                default="PENDING",
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="type",
+            field=models.CharField(
+                choices=[("NEW_BORROWING", "New Borrowing"), ("OVERDUE", "Overdue")],
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("status", "SENT"), _negated=True),
+                fields=["next_attempt_at"],
+                name="notification_unsent_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                fields=("type", "borrowing"), name="notification_once_per_borrowing"
+            ),
+        ),
+        # The constraint's index serves the (type, borrowing) lookups.
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notification_dedupe_idx",
+        ),
+    ]
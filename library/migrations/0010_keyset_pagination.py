@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0009_outboxevent"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={"ordering": ("id",)},
+        ),
+        migrations.AlterModelOptions(
+            name="borrowing",
+            options={"ordering": ("-expected_return_date", "id")},
+        ),
+        migrations.RemoveIndex(
+            model_name="borrowing",
+            name="borrowing_due_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="borrowing",
+            name="borrowing_user_due_idx",
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["-expected_return_date", "id"], name="borrowing_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["user", "-expected_return_date", "id"],
+                name="borrowing_user_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0011_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Charge",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("billed_on", models.DateField()),
+                ("base_fee", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("overdue_fee", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("total_fee", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "borrowing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="charges",
+                        to="library.borrowing",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("borrowing", "billed_on"), name="charge_once_per_day"
+                    )
+                ],
+            },
+        ),
+    ]
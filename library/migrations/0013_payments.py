@@ -0,0 +1,182 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:51
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0012_charge"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Payment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("payment_date", models.DateField(auto_now_add=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("PENDING", "Pending"), ("PAID", "Paid")],
+                        default="PENDING",
+                        max_length=7,
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("PAYMENT", "Payment"), ("FINE", "Fine")],
+                        default="PAYMENT",
+                        max_length=7,
+                    ),
+                ),
+                (
+                    "session_url",
+                    models.URLField(blank=True, max_length=1000, null=True),
+                ),
+                (
+                    "session_id",
+                    models.CharField(
+                        blank=True, max_length=255, null=True, unique=True
+                    ),
+                ),
+                (
+                    "money_to_pay",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Price in USD",
+                        max_digits=7,
+                        validators=[django.core.validators.MinValueValidator(0)],
+                    ),
+                ),
+                (
+                    "idempotency_key",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("paid_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="WebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("type", models.CharField(max_length=100)),
+                ("payload", models.JSONField()),
+                ("received_at", models.DateTimeField(auto_now_add=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name="notification",
+            name="notification_once_per_borrowing",
+        ),
+        migrations.RemoveField(
+            model_name="notification",
+            name="payment_id",
+        ),
+        migrations.AddField(
+            model_name="borrowing",
+            name="fees_paid",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Sum of the borrowing's paid payments, in USD.",
+                max_digits=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="type",
+            field=models.CharField(
+                choices=[
+                    ("NEW_BORROWING", "New Borrowing"),
+                    ("OVERDUE", "Overdue"),
+                    ("PAYMENT_SUCCESS", "Payment Success"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(
+                    ("actual_return_date__gt", models.F("expected_return_date"))
+                ),
+                fields=["actual_return_date"],
+                name="borrowing_late_return_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="borrowing",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to="library.borrowing",
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="payment",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="library.payment",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("payment__isnull", True)),
+                fields=("type", "borrowing"),
+                name="notification_once_per_borrowing",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                fields=("type", "payment"), name="notification_once_per_payment"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                condition=models.Q(("processed_at__isnull", True)),
+                fields=["received_at"],
+                name="webhook_unprocessed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("session_id__isnull", True), ("status", "PENDING")),
+                fields=["created_at"],
+                name="payment_unopened_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="payment",
+            constraint=models.UniqueConstraint(
+                fields=("borrowing", "type"), name="payment_once_per_type"
+            ),
+        ),
+    ]
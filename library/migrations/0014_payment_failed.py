@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0013_payments"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("PAID", "Paid"),
+                    ("FAILED", "Failed"),
+                ],
+                default="PENDING",
+                max_length=7,
+            ),
+        ),
+    ]
@@ -1,6 +1,25 @@
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, connections, models, transaction
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    Func,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models import sql
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
+from library.cache import invalidate_books
 from user.models import User
 
 
@@ -9,6 +28,87 @@ class Cover(models.TextChoices):
     SOFT = "SOFT", "Soft"
 
 
+def per_book(counts):
+    """Build a CASE expression that yields ``counts[id]`` for each book row."""
+    return Case(
+        *(When(id=book_id, then=Value(count)) for book_id, count in counts.items()),
+        default=Value(0),
+    )
+
+
+class BookQuerySet(models.QuerySet):
+    def update_returning_ids(self, **kwargs):
+        """
+        Like update(), but return the ids of the updated rows.
+
+        The ids come back with the UPDATE itself (RETURNING), so callers
+        can drop those books' cache entries without another query.
+        """
+        query = self.query.chain(sql.UpdateQuery)
+        query.add_update_values(kwargs)
+        query.clear_select_clause()
+        statement, params = query.get_compiler(self.db).as_sql()
+        pk = connections[self.db].ops.quote_name(self.model._meta.pk.column)
+        with transaction.mark_for_rollback_on_error(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(f"{statement} RETURNING {pk}", params)
+                return [book_id for book_id, in cursor.fetchall()]
+
+    def reserve(self):
+        """Take one copy of every matched book that is still in stock."""
+        reserved = self.filter(inventory__gt=0).update_returning_ids(
+            inventory=F("inventory") - 1, updated_at=timezone.now()
+        )
+        invalidate_books(reserved)
+        return len(reserved)
+
+    def reserve_many(self, book_ids):
+        """
+        Take one copy per occurrence of a book id in ``book_ids``.
+
+        The matched rows are locked in id order, so concurrent callers cannot
+        deadlock, and decremented with a single UPDATE. Returns a mapping of
+        book id to the number of copies actually reserved.
+        """
+        requested = Counter(book_ids)
+        stock = dict(
+            self.select_for_update()
+            .filter(id__in=requested, inventory__gt=0)
+            .order_by("id")
+            .values_list("id", "inventory")
+        )
+        reserved = {
+            book_id: min(count, stock[book_id])
+            for book_id, count in requested.items()
+            if book_id in stock
+        }
+        if reserved:
+            self.filter(id__in=reserved).update(
+                inventory=F("inventory") - per_book(reserved),
+                updated_at=timezone.now(),
+            )
+            invalidate_books(reserved)
+        return reserved
+
+    def restock(self):
+        """Put one copy of every matched book back on the shelf."""
+        restocked = self.update_returning_ids(
+            inventory=F("inventory") + 1, updated_at=timezone.now()
+        )
+        invalidate_books(restocked)
+        return len(restocked)
+
+    def restock_many(self, counts):
+        """Put ``counts[id]`` copies back for every book id in one UPDATE."""
+        if not counts:
+            return 0
+        invalidate_books(counts)
+        return self.filter(id__in=counts).update(
+            inventory=F("inventory") + per_book(counts),
+            updated_at=timezone.now(),
+        )
+
+
 class Book(models.Model):
     title = models.CharField(max_length=100)
     author = models.CharField(max_length=100)
@@ -22,41 +122,394 @@ class Book(models.Model):
         validators=[MinValueValidator(0)],
         help_text="Price in USD",
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("id",)
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
 
+class DaysBetween(Func):
+    """Whole days from ``start`` to ``end``; Postgres subtracts dates to an int."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = models.IntegerField()
+
+    def __init__(self, end, start):
+        super().__init__(end, start)
+
+
+def money():
+    return models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class BorrowingQuerySet(models.QuerySet):
+    def with_fees(self, as_of=None):
+        """
+        Annotate ``base_fee``, ``overdue_fee`` and ``total_fee`` in SQL.
+
+        The base fee pays for the agreed days from ``borrow_date`` to
+        ``expected_return_date``. Every day after that until the book comes
+        back, or until ``as_of`` while it is still out, costs ``daily_fee``
+        times ``FINE_MULTIPLIER``.
+        """
+        as_of = as_of or timezone.localdate()
+        returned = Coalesce("actual_return_date", Value(as_of))
+        daily_fee = F("book__daily_fee")
+        return self.annotate(
+            base_fee=ExpressionWrapper(
+                Greatest(DaysBetween("expected_return_date", "borrow_date"), 0)
+                * daily_fee,
+                output_field=money(),
+            ),
+            overdue_fee=ExpressionWrapper(
+                Greatest(DaysBetween(returned, "expected_return_date"), 0)
+                * daily_fee
+                * settings.FINE_MULTIPLIER,
+                output_field=money(),
+            ),
+        ).annotate(total_fee=F("base_fee") + F("overdue_fee"))
+
+    def fee_totals(self, as_of=None):
+        """Sum the fees of the matched borrowings per user in one query."""
+        return (
+            self.with_fees(as_of)
+            .order_by("user")
+            .values("user")
+            .annotate(
+                base=Sum("base_fee"),
+                overdue=Sum("overdue_fee"),
+                total=Sum("total_fee"),
+            )
+        )
+
+    def bill(self, as_of=None):
+        """
+        Record the fees of the matched borrowings as of ``as_of`` as charges.
+
+        The fees are computed and written by a single INSERT ... SELECT, so
+        no row passes through Python. Billing the same day again
+        overwrites that day's charges. Returns the number of rows written.
+        """
+        as_of = as_of or timezone.localdate()
+        rows = (
+            self.with_fees(as_of)
+            .order_by()
+            .values_list(
+                "id",
+                Value(as_of, output_field=models.DateField()),
+                "base_fee",
+                "overdue_fee",
+                "total_fee",
+                Value(timezone.now(), output_field=models.DateTimeField()),
+            )
+        )
+        sql, params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {Charge._meta.db_table} "
+                "(borrowing_id, billed_on, base_fee, overdue_fee, total_fee, "
+                f"created_at) {sql} "
+                "ON CONFLICT (borrowing_id, billed_on) DO UPDATE SET "
+                "base_fee = EXCLUDED.base_fee, "
+                "overdue_fee = EXCLUDED.overdue_fee, "
+                "total_fee = EXCLUDED.total_fee, "
+                "created_at = EXCLUDED.created_at",
+                params,
+            )
+            return cursor.rowcount
+
+
 class Borrowing(models.Model):
     borrow_date = models.DateField(auto_now_add=True)
     expected_return_date = models.DateField()
     actual_return_date = models.DateField(blank=True, null=True)
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="borrowing")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="borrowing")
+    fees_paid = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        help_text="Sum of the borrowing's paid payments, in USD.",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BorrowingQuerySet.as_manager()
 
     class Meta:
-        ordering = ("-expected_return_date",)
+        ordering = ("-expected_return_date", "id")
+        indexes = [
+            models.Index(
+                fields=["-expected_return_date", "id"], name="borrowing_due_idx"
+            ),
+            models.Index(
+                fields=["user", "-expected_return_date", "id"],
+                name="borrowing_user_due_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date"],
+                condition=Q(actual_return_date__isnull=True),
+                name="borrowing_open_due_idx",
+            ),
+            models.Index(
+                fields=["actual_return_date"],
+                condition=Q(actual_return_date__gt=F("expected_return_date")),
+                name="borrowing_late_return_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.book} borrowing {self.expected_return_date}"
 
 
+class Charge(models.Model):
+    """The fees a borrowing had accrued on ``billed_on``, written by a billing run."""
+
+    borrowing = models.ForeignKey(
+        Borrowing, on_delete=models.CASCADE, related_name="charges"
+    )
+    billed_on = models.DateField()
+    base_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    overdue_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    total_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing", "billed_on"],
+                name="charge_once_per_day",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.borrowing_id} on {self.billed_on}: {self.total_fee}"
+
+
+class Payment(models.Model):
+    """
+    A Stripe Checkout payment for a borrowing's fee or fine.
+
+    Rows are created PENDING by background tasks. create_payment_sessions
+    opens their Checkout sessions with ``idempotency_key``, so a retried
+    request never opens a second session, and process_webhook_events
+    marks them PAID once Stripe reports the checkout completed. Payments
+    Stripe rejects outright are marked FAILED and are not retried.
+    """
+
+    STATUSES = [
+        ("PENDING", "Pending"),
+        ("PAID", "Paid"),
+        ("FAILED", "Failed"),
+    ]
+    TYPES = [
+        ("PAYMENT", "Payment"),
+        ("FINE", "Fine"),
+    ]
+
+    payment_date = models.DateField(auto_now_add=True)
+    status = models.CharField(max_length=7, choices=STATUSES, default="PENDING")
+    type = models.CharField(max_length=7, choices=TYPES, default="PAYMENT")
+    session_url = models.URLField(max_length=1000, blank=True, null=True)
+    session_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    money_to_pay = models.DecimalField(
+        max_digits=7,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        help_text="Price in USD",
+    )
+    borrowing = models.ForeignKey(
+        Borrowing, on_delete=models.CASCADE, related_name="payments"
+    )
+    idempotency_key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=Q(session_id__isnull=True, status="PENDING"),
+                name="payment_unopened_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing", "type"],
+                name="payment_once_per_type",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.money_to_pay} USD for {self.borrowing_id}"
+
+
+class WebhookEvent(models.Model):
+    """
+    A verified Stripe event, stored by the webhook and handled in batches.
+
+    The Stripe event id is the primary key, so a redelivered event is
+    stored, and therefore handled, once.
+    """
+
+    # Event types the webhook stores; every other type is acknowledged
+    # and dropped.
+    PAID_TYPES = (
+        "checkout.session.completed",
+        "checkout.session.async_payment_succeeded",
+    )
+
+    id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["received_at"],
+                condition=Q(processed_at__isnull=True),
+                name="webhook_unprocessed_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.id}"
+
+
+def lease_deadline():
+    return timezone.now() + timedelta(seconds=settings.NOTIFICATION_LEASE)
+
+
+class NotificationQuerySet(models.QuerySet):
+    def due(self):
+        """
+        Notifications the dispatcher should hand to a worker now.
+
+        That is new or failed rows whose backoff has elapsed, plus rows whose
+        worker lease expired, as long as they have attempts left and were
+        not enqueued within the last lease period.
+        """
+        now = timezone.now()
+        return self.filter(
+            Q(status__in=("PENDING", "FAILED"))
+            | Q(status="SENDING", leased_until__lt=now),
+            next_attempt_at__lte=now,
+            attempts__lt=settings.NOTIFICATION_MAX_ATTEMPTS,
+        )
+
+    def claim(self):
+        """
+        Lease the matched rows to the calling worker and return their ids.
+
+        Rows that are already sent, leased by another worker or out of
+        attempts are skipped, so a notification enqueued twice is still
+        delivered once.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                self.filter(
+                    Q(status__in=("PENDING", "FAILED"))
+                    | Q(status="SENDING", leased_until__lt=now),
+                    attempts__lt=settings.NOTIFICATION_MAX_ATTEMPTS,
+                )
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)
+            )
+            self.model.objects.filter(id__in=ids).update(
+                status="SENDING",
+                leased_until=lease_deadline(),
+                attempts=F("attempts") + 1,
+            )
+        return ids
+
+
 class Notification(models.Model):
     NOTIF_TYPES = [
         ("NEW_BORROWING", "New Borrowing"),
         ("OVERDUE", "Overdue"),
+        ("PAYMENT_SUCCESS", "Payment Success"),
+    ]
+    STATUSES = [
+        ("PENDING", "Pending"),
+        ("SENDING", "Sending"),
+        ("SENT", "Sent"),
+        ("FAILED", "Failed"),
     ]
 
     type = models.CharField(max_length=20, choices=NOTIF_TYPES)
     borrowing = models.ForeignKey(
         Borrowing, on_delete=models.CASCADE, null=True, blank=True
     )
-    payment_id = models.IntegerField(null=True, blank=True)
+    payment = models.ForeignKey(
+        Payment, on_delete=models.CASCADE, null=True, blank=True
+    )
     status = models.CharField(
         max_length=10,
-        choices=[("PENDING", "Pending"), ("SENT", "Sent")],
+        choices=STATUSES,
         default="PENDING",
     )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        default=lease_deadline,
+        help_text="The dispatcher leaves the row alone until then.",
+    )
+    leased_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True, null=True)
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=~Q(status="SENT"),
+                name="notification_unsent_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["type", "borrowing"],
+                condition=Q(payment__isnull=True),
+                name="notification_once_per_borrowing",
+            ),
+            models.UniqueConstraint(
+                fields=["type", "payment"],
+                name="notification_once_per_payment",
+            ),
+        ]
+
+    def retry_at(self):
+        """When a failed delivery may be retried, doubling the delay each time."""
+        delay = settings.NOTIFICATION_RETRY_BACKOFF * 2 ** max(self.attempts - 1, 0)
+        return timezone.now() + timedelta(seconds=delay)
+
+
+class OutboxEvent(models.Model):
+    """
+    A domain event written in the same transaction as the change it describes.
+
+    relay_outbox drains committed events to Celery, so request handlers
+    never talk to the broker themselves.
+    """
+
+    TOPICS = [
+        ("borrowing.created", "Borrowing created"),
+        ("borrowing.bulk_created", "Borrowings created in bulk"),
+    ]
+
+    topic = models.CharField(max_length=50, choices=TOPICS)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.topic} {self.payload}"
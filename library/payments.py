@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.conf import settings
+
+
+class PaymentClient:
+    """
+    Opens Stripe Checkout sessions for payments from a small thread pool.
+
+    Every request carries the payment's ``idempotency_key``. The Stripe
+    library retries timeouts and 5xx answers with that same key, and so do
+    later sweeps, so however often a payment is retried it ends up with one
+    session.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        api_base="https://api.stripe.com",
+        pool_size=8,
+        max_network_retries=2,
+        timeout=10,
+    ):
+        self.stripe = stripe.StripeClient(
+            api_key,
+            base_addresses={"api": api_base},
+            max_network_retries=max_network_retries,
+            http_client=stripe.RequestsClient(timeout=timeout),
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="stripe"
+        )
+
+    def create_session(self, payment):
+        """Open the Checkout session of ``payment``; needs ``borrowing.book``."""
+        return self.stripe.v1.checkout.sessions.create(
+            params={
+                "mode": "payment",
+                "client_reference_id": str(payment.id),
+                "line_items": [
+                    {
+                        "quantity": 1,
+                        "price_data": {
+                            "currency": "usd",
+                            "unit_amount": int(payment.money_to_pay * 100),
+                            "product_data": {
+                                "name": f"{payment.get_type_display()}: "
+                                f"{payment.borrowing.book.title}",
+                            },
+                        },
+                    }
+                ],
+                "success_url": settings.PAYMENT_SUCCESS_URL,
+                "cancel_url": settings.PAYMENT_CANCEL_URL,
+            },
+            options={"idempotency_key": str(payment.idempotency_key)},
+        )
+
+    def create_sessions(self, payments):
+        """
+        Open the sessions of ``payments`` concurrently.
+
+        Returns ``(payment, session or exception)`` pairs, so one failure
+        does not lose the sessions that were opened.
+        """
+        futures = [
+            (payment, self.executor.submit(self.create_session, payment))
+            for payment in payments
+        ]
+        results = []
+        for payment, future in futures:
+            try:
+                results.append((payment, future.result()))
+            except stripe.StripeError as exc:
+                results.append((payment, exc))
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def is_rejected(error):
+    """Whether Stripe refused the request itself, so a retry cannot succeed."""
+    return isinstance(error, stripe.InvalidRequestError)
+
+
+_client = None
+_client_pid = None
+
+
+def get_client():
+    """Return this process's shared client, recreated after a fork."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = PaymentClient(
+            settings.STRIPE_SECRET_KEY,
+            api_base=settings.STRIPE_API_BASE,
+            pool_size=settings.STRIPE_POOL_SIZE,
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        )
+        _client_pid = os.getpid()
+    return _client
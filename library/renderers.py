@@ -0,0 +1,69 @@
+"""
+Renderers for API responses and metrics.
+
+ORJSONRenderer produces the same bytes as DRF's JSONRenderer, several times
+faster: orjson writes the types JSON has natively, and everything else
+(Decimal, datetime, lazy strings, querysets) goes through DRF's own
+encoder, so it is encoded exactly as before. MessagePackRenderer serves
+the same data to clients that send ``Accept: application/msgpack``.
+"""
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer on orjson, for compact, non-ASCII output without indent."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            # Integers past 64 bits and the like: let json have a go, and
+            # raise its error if it fails too.
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escape the separators JavaScript forbids in string literals, as
+        # JSONRenderer does.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+def msgpack_default(obj, encoder=JSONEncoder()):
+    return encoder.default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(
+            data, default=msgpack_default, use_bin_type=True, datetime=False
+        )
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Pass through a body that is already in the Prometheus text format."""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data.encode(self.charset) if isinstance(data, str) else data
@@ -0,0 +1,144 @@
+"""
+Bulk generation of realistic library data for load tests.
+
+Rows are generated inside Postgres with ``INSERT ... SELECT`` over
+``generate_series``, so a million borrowings never pass through Python.
+Random choices come from ``random()`` after ``setseed``, so the same seed
+and sizes give the same data.
+
+- Books get skewed popularity: a few titles take most borrowings.
+- Borrowings spread over the last two years. Most past-due ones are back,
+  some late. The rest are still out, and some of those are overdue.
+"""
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+from library.cache import invalidate_books
+from library.models import Book, Borrowing
+from user.models import User
+
+
+PASSWORD = "benchmark"
+
+
+def insert_users(count, offset):
+    """Insert ``count`` users that can log in with ``PASSWORD``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {User._meta.db_table} (
+                email, password, first_name, last_name,
+                is_superuser, is_staff, is_active, date_joined
+            )
+            SELECT 'reader' || i || '@example.com', %s, 'Reader', i::text,
+                   false, false, true, now()
+            FROM generate_series(%s, %s) AS i
+            ON CONFLICT (email) DO NOTHING
+            """,
+            [make_password(PASSWORD), offset + 1, offset + count],
+        )
+        return cursor.rowcount
+
+
+def insert_books(count, offset):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Book._meta.db_table} (
+                title, author, inventory, cover, daily_fee, updated_at
+            )
+            SELECT 'Book ' || i, 'Author ' || (i %% 5000),
+                   floor(random() * 20)::int,
+                   CASE WHEN random() < 0.4 THEN 'HARD' ELSE 'SOFT' END,
+                   round((0.5 + random() * 4.5)::numeric, 2), now()
+            FROM generate_series(%s, %s) AS i
+            """,
+            [offset + 1, offset + count],
+        )
+        return cursor.rowcount
+
+
+def insert_borrowings(count):
+    """Insert ``count`` borrowings of existing books by existing users."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Borrowing._meta.db_table} (
+                borrow_date, expected_return_date, actual_return_date,
+                book_id, user_id, fees_paid, updated_at
+            )
+            SELECT borrowed, due,
+                   CASE WHEN due < current_date AND returned < 0.9
+                        THEN LEAST(due + floor(late * 14)::int - 4, current_date)
+                   END,
+                   books.ids[1 + floor(power(book, 3) * books.n)::int],
+                   users.ids[1 + floor(reader * users.n)::int],
+                   0, now()
+            FROM (
+                SELECT current_date - floor(r1 * 730)::int AS borrowed,
+                       current_date - floor(r1 * 730)::int
+                           + 7 + floor(r2 * 24)::int AS due,
+                       r3 AS returned, r4 AS late, r5 AS book, r6 AS reader
+                FROM (
+                    SELECT random() AS r1, random() AS r2, random() AS r3,
+                           random() AS r4, random() AS r5, random() AS r6
+                    FROM generate_series(1, %s)
+                ) AS draws
+            ) AS rows,
+            (SELECT array_agg(id ORDER BY id) AS ids, count(*) AS n
+             FROM {Book._meta.db_table}) AS books,
+            (SELECT array_agg(id ORDER BY id) AS ids, count(*) AS n
+             FROM {User._meta.db_table}) AS users
+            """,
+            [count],
+        )
+        return cursor.rowcount
+
+
+def seed_library(
+    books=100_000,
+    users=50_000,
+    borrowings=1_000_000,
+    seed=0.42,
+    batch_size=100_000,
+    progress=None,
+):
+    """
+    Add ``books``, ``users`` and ``borrowings`` rows in batches.
+
+    ``progress`` is called with ``(table, rows so far, total)`` after each
+    batch. Returns the number of rows inserted per table. Raises
+    ImproperlyConfigured on a database other than PostgreSQL.
+    """
+    if connection.vendor != "postgresql":
+        raise ImproperlyConfigured("Seeding needs PostgreSQL.")
+
+    inserted = {"users": 0, "books": 0, "borrowings": 0}
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT setseed(%s)", [seed])
+        cursor.execute(f"SELECT count(*) FROM {User._meta.db_table}")
+        user_offset = cursor.fetchone()[0]
+        cursor.execute(f"SELECT count(*) FROM {Book._meta.db_table}")
+        book_offset = cursor.fetchone()[0]
+
+    for table, total, insert in (
+        ("users", users, lambda n: insert_users(n, user_offset + inserted["users"])),
+        ("books", books, lambda n: insert_books(n, book_offset + inserted["books"])),
+        ("borrowings", borrowings, insert_borrowings),
+    ):
+        done = 0
+        while done < total:
+            size = min(batch_size, total - done)
+            with transaction.atomic():
+                inserted[table] += insert(size)
+            done += size
+            if progress:
+                progress(table, done, total)
+
+    with connection.cursor() as cursor:
+        for model in (User, Book, Borrowing):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+    if inserted["books"]:
+        invalidate_books([], listed=True)
+    return inserted
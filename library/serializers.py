@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from library.models import Book, Borrowing
+from library.models import Book, Borrowing, Payment
 
 
 class BookListSerializer(serializers.ModelSerializer):
@@ -41,6 +41,15 @@ class BorrowingListSerializer(serializers.ModelSerializer):
 
 
 class BorrowingDetailSerializer(serializers.ModelSerializer):
+    base_fee = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
+    overdue_fee = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
+    total_fee = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
 
     class Meta:
         model = Borrowing
@@ -50,5 +59,55 @@ class BorrowingDetailSerializer(serializers.ModelSerializer):
             "borrow_date",
             "expected_return_date",
             "user",
+            "base_fee",
+            "overdue_fee",
+            "total_fee",
+            "fees_paid",
         )
-        read_only_fields = ("id", "user")
+        read_only_fields = ("id", "user", "fees_paid")
+
+
+class BorrowingFeesSerializer(serializers.Serializer):
+    base = serializers.DecimalField(max_digits=12, decimal_places=2)
+    overdue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class BorrowingBulkCreateSerializer(serializers.Serializer):
+    books = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=50
+    )
+    expected_return_date = serializers.DateField()
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=500
+    )
+
+
+class BorrowingExportSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
+    borrowed_after = serializers.DateField(required=False)
+    borrowed_before = serializers.DateField(required=False)
+    user = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=["open", "returned"], required=False)
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    book_title = serializers.CharField(source="borrowing.book.title", read_only=True)
+
+    class Meta:
+        model = Payment
+        fields = (
+            "id",
+            "borrowing",
+            "book_title",
+            "type",
+            "status",
+            "money_to_pay",
+            "session_url",
+            "payment_date",
+            "paid_at",
+        )
+        read_only_fields = fields
@@ -1,18 +1,22 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .models import Borrowing, Notification
-from .tasks import send_notification
+from .cache import invalidate_books
+from .models import Book, Borrowing, OutboxEvent
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_changed(sender, instance, **kwargs):
+    invalidate_books([instance.pk], listed=True)
+
 
 @receiver(post_save, sender=Borrowing)
 def borrowing_post_save(sender, instance, created, **kwargs):
 
     if created:
 
-        notif = Notification.objects.create(
-            type="NEW_BORROWING",
-            borrowing=instance,
-            status="PENDING",
+        OutboxEvent.objects.create(
+            topic="borrowing.created",
+            payload={"borrowing_id": instance.id},
         )
-
-        send_notification.delay(notif.id)
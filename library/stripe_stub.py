@@ -0,0 +1,142 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class StripeStub:
+    """
+    A local stand-in for the Stripe Checkout Sessions API.
+
+    It opens sessions on ``POST /v1/checkout/sessions`` and replays the
+    stored response for a repeated ``Idempotency-Key``, as Stripe does.
+    ``fail_next`` answers that many requests with a 500 first, amounts
+    below Stripe's 50 cent minimum are refused with a 400, and
+    ``latency`` delays every answer, so tests and benchmarks can exercise
+    retries and throughput without network access. ``completed_event``
+    and ``sign`` build webhook deliveries for the sessions it opened.
+    Use it as a context manager and point a client at ``stub.url``.
+    """
+
+    def __init__(self, latency=0.0, fail_next=0, webhook_secret="whsec_test"):
+        self.latency = latency
+        self.fail_next = fail_next
+        self.webhook_secret = webhook_secret
+        self.requests = []
+        self.sessions = {}
+        self.replies = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = dict(parse_qsl(self.rfile.read(length).decode()))
+                key = self.headers.get("Idempotency-Key")
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub.lock:
+                    stub.requests.append((time.monotonic(), key, form))
+                    if self.path != "/v1/checkout/sessions":
+                        status, body = 404, stub.error("Unrecognized request URL")
+                    elif stub.fail_next:
+                        stub.fail_next -= 1
+                        status, body = 500, stub.error("Injected failure")
+                    elif stub.below_minimum(form):
+                        status, body = 400, stub.error(
+                            "Amount must be at least $0.50 usd",
+                            type="invalid_request_error",
+                        )
+                    elif key in stub.replies:
+                        status, body = 200, stub.replies[key]
+                    else:
+                        status, body = 200, stub.open_session(form)
+                        if key:
+                            stub.replies[key] = body
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @staticmethod
+    def error(message, type="api_error"):
+        return {"error": {"type": type, "message": message}}
+
+    @staticmethod
+    def below_minimum(form):
+        amount = form.get("line_items[0][price_data][unit_amount]")
+        return amount is not None and int(amount) < 50
+
+    def open_session(self, form):
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "mode": form.get("mode"),
+            "client_reference_id": form.get("client_reference_id"),
+            "amount_total": int(form.get("line_items[0][price_data][unit_amount]", 0)),
+            "currency": form.get("line_items[0][price_data][currency]"),
+            "payment_status": "unpaid",
+            "status": "open",
+            "url": f"{self.url}/pay/{session_id}",
+        }
+        self.sessions[session_id] = session
+        return session
+
+    def completed_event(self, session_id):
+        """The JSON body of a ``checkout.session.completed`` delivery."""
+        session = dict(
+            self.sessions[session_id], payment_status="paid", status="complete"
+        )
+        return json.dumps(
+            {
+                "id": f"evt_{uuid.uuid4().hex}",
+                "object": "event",
+                "type": "checkout.session.completed",
+                "created": int(time.time()),
+                "data": {"object": session},
+            }
+        ).encode()
+
+    def sign(self, payload, timestamp=None):
+        """The ``Stripe-Signature`` header Stripe would send with ``payload``."""
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        signature = hmac.new(
+            self.webhook_secret.encode(),
+            f"{timestamp}.".encode() + payload,
+            hashlib.sha256,
+        ).hexdigest()
+        return f"t={timestamp},v1={signature}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
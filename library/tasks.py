@@ -1,70 +1,647 @@
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import (
+    Count,
+    DecimalField,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from library.models import Borrowing, Notification
+from library import metrics
+from library.models import (
+    Borrowing,
+    Notification,
+    OutboxEvent,
+    Payment,
+    WebhookEvent,
+    lease_deadline,
+)
+from library.payments import get_client as get_payment_client
+from library.payments import is_rejected
+from library.telegram import get_client
 
-import requests
 from celery import shared_task
 from django.conf import settings
 
 
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/sendMessage"
 ADMIN_CHAT_IDS = settings.TELEGRAM_ADMIN_CHAT_IDS
+OVERDUE_BATCH_SIZE = 1000
+DISPATCH_LIMIT = 1000
+# Rows are claimed this many at a time, right before they are sent. At
+# TELEGRAM_CHAT_RATE messages per second per admin chat, a chunk then takes
+# a tenth of the lease, leaving room for ten workers sharing the chats.
+DELIVERY_CHUNK_SIZE = max(
+    1, settings.NOTIFICATION_LEASE * settings.TELEGRAM_CHAT_RATE // 10
+)
+OUTBOX_BATCH_SIZE = 500
+PAYMENT_BATCH_SIZE = 100
+WEBHOOK_BATCH_SIZE = 500
+# Unopened payments younger than this are left to the task already enqueued.
+PAYMENT_SWEEP_DELAY = timedelta(minutes=5)
+DELIVERY_FIELDS = [
+    "status",
+    "error_message",
+    "next_attempt_at",
+    "sent_at",
+    "leased_until",
+]
+
+
+def broadcast(text):
+    get_client().broadcast(ADMIN_CHAT_IDS, text)
+
+
+def render_notification(notif):
+    if notif.type == "NEW_BORROWING" and notif.borrowing:
+        return (
+            f"New borrowing: {notif.borrowing.book.title} "
+            f"by {notif.borrowing.user.email}, due"
+            f" {notif.borrowing.expected_return_date}"
+        )
+    if notif.type == "OVERDUE" and notif.borrowing:
+        return (
+            f"Overdue borrowing: "
+            f"{notif.borrowing.book.title} by "
+            f"{notif.borrowing.user.email}, was due "
+            f"{notif.borrowing.expected_return_date}"
+        )
+    if notif.type == "PAYMENT_SUCCESS" and notif.payment and notif.borrowing:
+        return (
+            f"Payment received: {notif.payment.money_to_pay} USD "
+            f"{notif.payment.get_type_display().lower()} for "
+            f"{notif.borrowing.book.title} by {notif.borrowing.user.email}"
+        )
+    return "Unknown notification"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
-def send_telegram_message(chat_id, text):
-    response = requests.post(
-        TELEGRAM_API_URL,
-        data={"chat_id": chat_id, "text": text},
-        timeout=5
+def claim_for_delivery(notification_ids):
+    """Lease the given notifications and load them with one joined query."""
+    claimed = Notification.objects.filter(id__in=notification_ids).claim()
+    return list(
+        Notification.objects.filter(id__in=claimed)
+        .select_related("borrowing__book", "borrowing__user", "payment")
+        .only(
+            *DELIVERY_FIELDS,
+            "type",
+            "attempts",
+            "borrowing__expected_return_date",
+            "borrowing__book__title",
+            "borrowing__user__email",
+            "payment__type",
+            "payment__money_to_pay",
+        )
     )
-    response.raise_for_status()
-    return response.json()
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def send_notification(self, notification_id):
-    notif = Notification.objects.get(id=notification_id)
+def deliver(notification_ids):
+    """
+    Claim the given notifications, send them and record every outcome.
+
+    Rows are claimed DELIVERY_CHUNK_SIZE at a time, so a row's lease runs
+    from just before it is sent. Each chunk costs a constant number of
+    queries: the claim, one joined SELECT and one bulk UPDATE. A failed
+    row goes back to FAILED with a backoff, after which
+    dispatch_notifications picks it up again.
+    """
+    return sum(
+        deliver_chunk(chunk)
+        for chunk in chunked(notification_ids, DELIVERY_CHUNK_SIZE)
+    )
+
+
+def deliver_chunk(notification_ids):
+    notifs = claim_for_delivery(notification_ids)
+    for notif in notifs:
+        try:
+            broadcast(render_notification(notif))
+        except Exception as exc:
+            notif.status = "FAILED"
+            notif.error_message = str(exc)
+            notif.next_attempt_at = notif.retry_at()
+        else:
+            notif.status = "SENT"
+            notif.sent_at = timezone.now()
+            notif.error_message = None
+        notif.leased_until = None
+        metrics.notification_deliveries.inc(
+            notif.type, notif.status.lower(), "yes" if notif.attempts > 1 else "no"
+        )
+
+    Notification.objects.bulk_update(notifs, DELIVERY_FIELDS)
+    return len(notifs)
+
+
+@shared_task
+def send_notification(notification_id):
+    return deliver([notification_id])
+
+
+@shared_task
+def send_notifications(notification_ids):
+    return deliver(notification_ids)
+
+
+@shared_task
+def send_borrowing_summary(notification_ids):
+    """Send one message for several NEW_BORROWING notifications."""
+    notifs = claim_for_delivery(notification_ids)
+    borrowings = [notif.borrowing for notif in notifs if notif.borrowing]
+    if not borrowings:
+        return
+
     try:
-        if notif.type == "NEW_BORROWING" and notif.borrowing:
-            text = (
-                f"New borrowing: {notif.borrowing.book.title} "
-                f"by {notif.borrowing.user.email}, due"
-                f" {notif.borrowing.expected_return_date}"
+        text = "\n".join(
+            [f"New borrowings by {borrowings[0].user.email}:"]
+            + [
+                f"- {b.book.title}, due {b.expected_return_date}"
+                for b in borrowings
+            ]
+        )
+        broadcast(text)
+        Notification.objects.filter(id__in=[n.id for n in notifs]).update(
+            status="SENT", sent_at=timezone.now(), leased_until=None
+        )
+
+    except Exception as exc:
+        Notification.objects.filter(id__in=[n.id for n in notifs]).update(
+            status="FAILED",
+            error_message=str(exc),
+            next_attempt_at=max(notif.retry_at() for notif in notifs),
+            leased_until=None,
+        )
+
+
+def publish(notification_ids, summaries=()):
+    """
+    Enqueue delivery of the given notifications.
+
+    In digest mode nothing is enqueued: the rows wait for the next
+    send_notification_digest run instead.
+    """
+    if settings.NOTIFICATION_DIGEST_WINDOW:
+        return
+    for chunk in chunked(notification_ids, OVERDUE_BATCH_SIZE):
+        send_notifications.delay(chunk)
+    for ids in summaries:
+        send_borrowing_summary.delay(ids)
+
+
+@shared_task
+def dispatch_notifications():
+    """
+    Enqueue every notification that is due for a (re)try.
+
+    Picked rows have their next attempt pushed out by a lease period, so a
+    notification waiting in the queue is not enqueued again on the next
+    beat. The worker lease itself is only taken by claim().
+    """
+    if settings.NOTIFICATION_DIGEST_WINDOW:
+        return 0
+
+    Notification.objects.filter(
+        status="SENDING",
+        leased_until__lt=timezone.now(),
+        attempts__gte=settings.NOTIFICATION_MAX_ATTEMPTS,
+    ).update(status="FAILED", error_message="Lease expired", leased_until=None)
+
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.due()
+            .order_by("next_attempt_at")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:DISPATCH_LIMIT]
+        )
+        Notification.objects.filter(id__in=ids).update(
+            next_attempt_at=lease_deadline()
+        )
+
+    publish(ids)
+    return len(ids)
+
+
+def overdue_borrowings(today):
+    """Open borrowings past their due date that have no OVERDUE notification."""
+    return (
+        Borrowing.objects.filter(
+            expected_return_date__lt=today, actual_return_date__isnull=True
+        )
+        .filter(
+            ~Exists(
+                Notification.objects.filter(
+                    type="OVERDUE", borrowing=OuterRef("pk"), payment__isnull=True
+                )
             )
-        elif notif.type == "OVERDUE" and notif.borrowing:
-            text = (
-                f"Overdue borrowing: "
-                f"{notif.borrowing.book.title} by "
-                f"{notif.borrowing.user.email}, was due "
-                f"{notif.borrowing.expected_return_date}"
+        )
+        .order_by()
+    )
+
+
+@shared_task
+def check_overdue_borrowings():
+    """
+    Create an OVERDUE notification for every overdue borrowing without one.
+
+    The borrowings are found with an anti-join and streamed from a
+    server-side cursor; each chunk is inserted with one bulk_create and
+    handed to a single send_notifications task. The unique constraint on
+    (type, borrowing) makes overlapping scans harmless.
+    """
+    overdue_ids = overdue_borrowings(timezone.now().date()).values_list(
+        "id", flat=True
+    )
+    created = 0
+    for chunk in chunked(
+        overdue_ids.iterator(chunk_size=OVERDUE_BATCH_SIZE), OVERDUE_BATCH_SIZE
+    ):
+        Notification.objects.bulk_create(
+            (
+                Notification(type="OVERDUE", borrowing_id=borrowing_id)
+                for borrowing_id in chunk
+            ),
+            ignore_conflicts=True,
+        )
+        notif_ids = list(
+            Notification.objects.filter(
+                type="OVERDUE", borrowing_id__in=chunk, status="PENDING"
+            ).values_list("id", flat=True)
+        )
+        publish(notif_ids)
+        created += len(notif_ids)
+    return created
+
+
+def publish_relayed(notification_ids, summaries, payment_ids):
+    publish(notification_ids, summaries)
+    open_sessions(payment_ids)
+
+
+@shared_task
+def relay_outbox():
+    """
+    Drain committed outbox events into notifications and delivery tasks.
+
+    Each batch is locked with SKIP LOCKED, turned into NEW_BORROWING
+    notifications and PAYMENT payments for the base fees with one
+    bulk_create each, and deleted in the same transaction. The delivery
+    and session tasks are published only after that commit, so a worker
+    never sees a row that does not exist yet. If publishing
+    fails, dispatch_notifications picks the rows up once their lease ends.
+    """
+    relayed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.order_by("id")
+                .select_for_update(skip_locked=True)[:OUTBOX_BATCH_SIZE]
             )
+            if not events:
+                return relayed
 
-        else:
-            text = "Unknown notification"
+            groups = [
+                [event.payload["borrowing_id"]]
+                if event.topic == "borrowing.created"
+                else event.payload["borrowing_ids"]
+                for event in events
+            ]
+            borrowing_ids = set(
+                Borrowing.objects.filter(
+                    id__in=[pk for group in groups for pk in group]
+                ).values_list("id", flat=True)
+            )
+            Notification.objects.bulk_create(
+                (
+                    Notification(type="NEW_BORROWING", borrowing_id=pk)
+                    for pk in borrowing_ids
+                ),
+                ignore_conflicts=True,
+            )
+            notif_ids = dict(
+                Notification.objects.filter(
+                    type="NEW_BORROWING",
+                    borrowing_id__in=borrowing_ids,
+                    status="PENDING",
+                ).values_list("borrowing_id", "id")
+            )
+            payment_ids = add_payments(borrowing_ids, "PAYMENT", "base_fee")
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+            singles, summaries = [], []
+            for event, group in zip(events, groups):
+                ids = [notif_ids[pk] for pk in group if pk in notif_ids]
+                if event.topic == "borrowing.created":
+                    singles.extend(ids)
+                elif ids:
+                    summaries.append(ids)
+            transaction.on_commit(
+                partial(publish_relayed, singles, summaries, payment_ids)
+            )
+        relayed += len(events)
 
-        for chat_id in ADMIN_CHAT_IDS:
-            send_telegram_message(chat_id, text)
 
-        notif.status = "SENT"
-        notif.sent_at = timezone.now()
-        notif.save()
+def render_digest(notifs):
+    """Summarise claimed notifications by type, with counts and top items."""
+    labels = dict(Notification.NOTIF_TYPES)
+    top = settings.NOTIFICATION_DIGEST_TOP_ITEMS
+    counts = dict(
+        notifs.values_list("type").annotate(count=Count("id")).order_by("type")
+    )
+    lines = [f"Library digest: {sum(counts.values())} notifications"]
+    for notif_type, count in counts.items():
+        lines.append(f"{labels.get(notif_type, notif_type)} ({count}):")
+        items = (
+            notifs.filter(type=notif_type, borrowing__isnull=False)
+            .order_by("borrowing__expected_return_date")
+            .values_list(
+                "borrowing__book__title",
+                "borrowing__user__email",
+                "borrowing__expected_return_date",
+            )[:top]
+        )
+        lines.extend(f"- {title} by {email}, due {due}" for title, email, due in items)
+        if count > top:
+            lines.append(f"... and {count - top} more")
+    return "\n".join(lines)
+
+
+@shared_task
+def send_notification_digest():
+    """
+    Send one summary of every undelivered notification to each admin chat.
 
+    Used instead of per-event messages when NOTIFICATION_DIGEST_WINDOW is
+    set; the included rows are marked with a single UPDATE. A failed
+    digest gives the rows their attempt back, so an outage delays them to
+    the next window that gets through instead of using up their attempts.
+    """
+    ids = Notification.objects.claim()
+    if not ids:
+        return 0
+
+    notifs = Notification.objects.filter(id__in=ids)
+    # A row that carries an error has been tried before.
+    outcomes = list(
+        notifs.values_list("type")
+        .annotate(
+            first=Count("id", filter=Q(error_message__isnull=True)),
+            retried=Count("id", filter=Q(error_message__isnull=False)),
+        )
+        .order_by("type")
+    )
+    try:
+        broadcast(render_digest(notifs))
     except Exception as exc:
-        notif.status = "FAILED"
-        notif.error_message = str(exc)
-        notif.save()
-        raise self.retry(exc=exc)
+        notifs.update(
+            status="FAILED",
+            error_message=str(exc),
+            leased_until=None,
+            attempts=F("attempts") - 1,
+        )
+        count_digest_deliveries(outcomes, "failed")
+        raise
+    notifs.update(
+        status="SENT", sent_at=timezone.now(), error_message=None, leased_until=None
+    )
+    count_digest_deliveries(outcomes, "sent")
+    return len(ids)
+
+
+def count_digest_deliveries(outcomes, result):
+    for notif_type, first, retried in outcomes:
+        for label, amount in (("no", first), ("yes", retried)):
+            if amount:
+                metrics.notification_deliveries.inc(
+                    notif_type, result, label, amount=amount
+                )
+
+
+def billable_borrowings(as_of):
+    """Open borrowings, plus those returned since the previous billing month began."""
+    period_start = (as_of.replace(day=1) - timedelta(days=1)).replace(day=1)
+    return Borrowing.objects.filter(
+        Q(actual_return_date__isnull=True) | Q(actual_return_date__gte=period_start)
+    )
 
 
 @shared_task
-def check_overdue_borrowings():
-    today = timezone.now().date()
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lt=today, actual_return_date__isnull=True
+def run_billing():
+    """
+    Record every billable borrowing's fees as of today.
+
+    The fees are computed and inserted by one INSERT ... SELECT, so the
+    run costs one statement however many borrowings are billed.
+    """
+    return billable_borrowings(timezone.localdate()).bill()
+
+
+def add_payments(borrowing_ids, payment_type, fee):
+    """
+    Create a PENDING ``payment_type`` payment of ``fee`` for each borrowing.
+
+    ``fee`` names a with_fees annotation; borrowings that owe nothing get
+    no payment. The unique constraint on (borrowing, type) makes repeats
+    harmless. Returns the ids of the payments that still need a session.
+    """
+    amounts = (
+        Borrowing.objects.filter(id__in=borrowing_ids)
+        .with_fees()
+        .filter(**{f"{fee}__gt": 0})
+        .order_by()
+        .values_list("id", fee)
+    )
+    Payment.objects.bulk_create(
+        (
+            Payment(borrowing_id=pk, type=payment_type, money_to_pay=amount)
+            for pk, amount in amounts
+        ),
+        ignore_conflicts=True,
+    )
+    return list(
+        Payment.objects.filter(
+            borrowing_id__in=borrowing_ids,
+            type=payment_type,
+            status="PENDING",
+            session_id__isnull=True,
+        ).values_list("id", flat=True)
+    )
+
+
+def open_sessions(payment_ids):
+    """Enqueue session creation for the given payments in chunks."""
+    for chunk in chunked(payment_ids, PAYMENT_BATCH_SIZE):
+        create_payment_sessions.delay(chunk)
+
+
+def late_returns():
+    """
+    Borrowings returned after their due date that have no FINE payment.
+
+    Books without a daily fee are left out: they owe no fine, so they would
+    otherwise be scanned again on every sweep.
+    """
+    return (
+        Borrowing.objects.filter(actual_return_date__gt=F("expected_return_date"))
+        .filter(book__daily_fee__gt=0)
+        .filter(
+            ~Exists(Payment.objects.filter(type="FINE", borrowing=OuterRef("pk")))
+        )
+        .order_by()
+    )
+
+
+@shared_task
+def create_payments():
+    """
+    Create FINE payments for late returns and reopen stalled payments.
+
+    Late returns are found with an anti-join on a partial index, so a
+    return request never waits for Stripe. Payments that are still without
+    a session after PAYMENT_SWEEP_DELAY, because their task was lost or
+    Stripe kept failing, are enqueued again; their idempotency keys keep
+    Stripe from opening a second session.
+    """
+    fines = []
+    for chunk in chunked(
+        late_returns().values_list("id", flat=True).iterator(PAYMENT_BATCH_SIZE),
+        PAYMENT_BATCH_SIZE,
+    ):
+        fines.extend(add_payments(chunk, "FINE", "overdue_fee"))
+    stalled = Payment.objects.filter(
+        status="PENDING",
+        session_id__isnull=True,
+        created_at__lt=timezone.now() - PAYMENT_SWEEP_DELAY,
+    ).values_list("id", flat=True)
+    payment_ids = sorted(set(fines).union(stalled))
+    open_sessions(payment_ids)
+    return len(payment_ids)
+
+
+@shared_task
+def create_payment_sessions(payment_ids):
+    """
+    Open the Checkout sessions of the given payments and store them.
+
+    Payments that are paid or already have a session are skipped. The
+    sessions are opened concurrently and saved with one bulk UPDATE; a
+    payment that still fails after the client's retries is left for the
+    next create_payments sweep, unless Stripe rejected the request itself
+    (an amount below its minimum, say), which marks it FAILED. Returns the
+    number of sessions opened.
+    """
+    payments = list(
+        Payment.objects.filter(
+            id__in=payment_ids, status="PENDING", session_id__isnull=True
+        )
+        .select_related("borrowing__book")
+        .only("type", "money_to_pay", "idempotency_key", "borrowing__book__title")
+    )
+    opened, rejected = [], []
+    for payment, session in get_payment_client().create_sessions(payments):
+        if isinstance(session, Exception):
+            if is_rejected(session):
+                rejected.append(payment.id)
+            continue
+        payment.session_id = session.id
+        payment.session_url = session.url
+        opened.append(payment)
+    Payment.objects.bulk_update(opened, ["session_id", "session_url"])
+    if rejected:
+        Payment.objects.filter(id__in=rejected).update(status="FAILED")
+    return len(opened)
+
+
+def paid_payment_id(event):
+    """The id of the payment a paid-checkout event settles, if any."""
+    session = event.payload.get("data", {}).get("object", {})
+    if event.type not in WebhookEvent.PAID_TYPES:
+        return None
+    if session.get("payment_status") != "paid":
+        return None
+    try:
+        return int(session["client_reference_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+@shared_task
+def process_webhook_events():
+    """
+    Apply the Stripe events stored by the webhook, in batches.
+
+    Each batch is locked with SKIP LOCKED. Its payments are marked PAID
+    with one UPDATE, their borrowings' ``fees_paid`` is recomputed with
+    another, and a PAYMENT_SUCCESS notification per payment is created
+    with one bulk_create. The events are marked processed in the same
+    transaction, and the notifications are published after it commits.
+    """
+    paid_total = Coalesce(
+        Subquery(
+            Payment.objects.filter(borrowing=OuterRef("pk"), status="PAID")
+            .order_by()
+            .values("borrowing")
+            .annotate(total=Sum("money_to_pay"))
+            .values("total")
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
     )
-    for b in overdue_borrowings:
-        if not Notification.objects.filter(
-            type="OVERDUE", borrowing=b, status="SENT"
-        ).exists():
-            notif = Notification.objects.create(type="OVERDUE", borrowing=b)
-            send_notification.delay(notif.id)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.filter(processed_at__isnull=True)
+                .order_by("received_at")
+                .select_for_update(skip_locked=True)[:WEBHOOK_BATCH_SIZE]
+            )
+            if not events:
+                return processed
+
+            now = timezone.now()
+            paid = dict(
+                Payment.objects.filter(
+                    id__in=[paid_payment_id(event) for event in events],
+                    status="PENDING",
+                )
+                .select_for_update()
+                .values_list("id", "borrowing_id")
+            )
+            Payment.objects.filter(id__in=paid).update(status="PAID", paid_at=now)
+            Borrowing.objects.filter(id__in=set(paid.values())).update(
+                fees_paid=paid_total, updated_at=now
+            )
+            Notification.objects.bulk_create(
+                (
+                    Notification(
+                        type="PAYMENT_SUCCESS",
+                        borrowing_id=borrowing_id,
+                        payment_id=payment_id,
+                    )
+                    for payment_id, borrowing_id in paid.items()
+                ),
+                ignore_conflicts=True,
+            )
+            notif_ids = list(
+                Notification.objects.filter(
+                    type="PAYMENT_SUCCESS", payment_id__in=paid, status="PENDING"
+                ).values_list("id", flat=True)
+            )
+            WebhookEvent.objects.filter(
+                id__in=[event.id for event in events]
+            ).update(processed_at=now)
+            transaction.on_commit(partial(publish, notif_ids))
+        processed += len(events)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimit:
+    """
+    Allow ``rate`` acquisitions per second between every process sharing
+    the default cache.
+
+    Acquisitions are counted in one-second windows under ``key``; with the
+    Redis cache the counts are exact across Celery worker processes. A
+    window may start right after a full one ends, so short bursts of up to
+    twice ``rate`` are possible.
+    """
+
+    def __init__(self, key, rate):
+        self.key = key
+        self.rate = rate
+
+    def acquire(self):
+        """Block until the current window has room, then take a slot."""
+        while True:
+            now = time.time()
+            window = int(now)
+            counter = f"{self.key}:{window}"
+            try:
+                count = cache.incr(counter)
+            except ValueError:
+                if cache.add(counter, 1, timeout=2):
+                    count = 1
+                else:
+                    continue
+            if count <= self.rate:
+                return
+            time.sleep(window + 1 - now)
+
+
+class TelegramClient:
+    """
+    Bot API client that keeps its connections alive between messages.
+
+    Messages to different chats go out in parallel from a small thread
+    pool. Token buckets space this process's messages, and shared limits
+    in the cache hold every worker process together within Telegram's
+    global and per-chat rate limits.
+    """
+
+    def __init__(
+        self,
+        token,
+        api_url="https://api.telegram.org",
+        pool_size=8,
+        global_rate=30,
+        chat_rate=1,
+        timeout=5,
+    ):
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        self.timeout = timeout
+        self.chat_rate = chat_rate
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="telegram"
+        )
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.global_limit = SharedRateLimit("telegram:rate", global_rate)
+        self.chat_buckets = {}
+        self.lock = threading.Lock()
+
+    def chat_bucket(self, chat_id):
+        with self.lock:
+            if chat_id not in self.chat_buckets:
+                self.chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+            return self.chat_buckets[chat_id]
+
+    def send_message(self, chat_id, text):
+        self.chat_bucket(chat_id).acquire()
+        SharedRateLimit(f"telegram:rate:{chat_id}", self.chat_rate).acquire()
+        self.global_bucket.acquire()
+        self.global_limit.acquire()
+        response = self.session.post(
+            self.url,
+            data={"chat_id": chat_id, "text": text},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def broadcast(self, chat_ids, text):
+        """Send ``text`` to every chat concurrently; raise the first failure."""
+        futures = [
+            self.executor.submit(self.send_message, chat_id, text)
+            for chat_id in chat_ids
+        ]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+
+
+def get_client():
+    """
+    Return this process's shared client.
+
+    The client is created lazily and recreated after a fork, so every
+    Celery worker process owns its own connection pool and token buckets;
+    only the SharedRateLimit counters are common to all of them.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = TelegramClient(
+            settings.BOT_TOKEN,
+            api_url=settings.TELEGRAM_API_URL,
+            pool_size=settings.TELEGRAM_POOL_SIZE,
+            global_rate=settings.TELEGRAM_GLOBAL_RATE,
+            chat_rate=settings.TELEGRAM_CHAT_RATE,
+        )
+        _client_pid = os.getpid()
+    return _client
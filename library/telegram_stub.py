@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class TelegramStub:
+    """
+    A local stand-in for the Bot API ``sendMessage`` endpoint.
+
+    It records every message with its arrival time and counts the TCP
+    connections it accepted, so tests and benchmarks can check throughput,
+    connection reuse and rate-limit compliance without network access.
+    Use it as a context manager and point a client at ``stub.url``.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub.lock:
+                    stub.messages.append(
+                        (time.monotonic(), form["chat_id"][0], form["text"][0])
+                    )
+                body = json.dumps({"ok": True, "result": {}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def times(self, chat_id=None):
+        """Arrival times of the recorded messages, optionally for one chat."""
+        return [
+            at for at, chat, _ in self.messages
+            if chat_id is None or chat == str(chat_id)
+        ]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,222 @@
+import re
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library.models import Book, Borrowing, Cover
+from library.views import BookViewSet, BorrowingViewSet
+from user.models import User
+from user.views import ManageUserView
+
+
+BOOK_URL = "/api/library/books/"
+BORROWING_URL = "/api/library/borrowings/"
+ME_URL = "/api/user/me/"
+ASGI_URLS = "library_service_api.asgi_urls"
+
+
+def detail_url(url, pk):
+    return f"{url}{pk}/"
+
+
+def query_count(response):
+    return int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.other = User.objects.create_user(
+            email="other@test.com",
+            password="testpass123"
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                inventory=5,
+                cover=Cover.HARD,
+                daily_fee=1.00
+            )
+            for i in range(3)
+        ]
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.books[0],
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        Borrowing.objects.create(
+            user=self.other,
+            book=self.books[1],
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+        self.token = str(AccessToken.for_user(self.user))
+
+    def headers(self, token=True, **headers):
+        if token:
+            headers.setdefault("Authorization", f"Bearer {self.token}")
+        return headers
+
+    async def async_get(self, url, data=None, **headers):
+        with override_settings(ROOT_URLCONF=ASGI_URLS):
+            return await self.async_client.get(
+                url, data, headers=self.headers(**headers)
+            )
+
+    async def assertSameResponse(self, url, data=None, **headers):
+        cache.clear()
+        expected = await sync_to_async(self.client.get)(
+            url, data, headers=self.headers(**headers)
+        )
+        cache.clear()
+        response = await self.async_get(url, data, **headers)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response["Content-Type"], expected["Content-Type"])
+        self.assertEqual(response.get("ETag"), expected.get("ETag"))
+        self.assertEqual(query_count(response), query_count(expected))
+        return response
+
+    async def test_reads_match_sync_views(self):
+        for url in (
+            BOOK_URL,
+            detail_url(BOOK_URL, self.books[1].id),
+            BORROWING_URL,
+            detail_url(BORROWING_URL, self.borrowing.id),
+            ME_URL,
+        ):
+            with self.subTest(url=url):
+                response = await self.assertSameResponse(url)
+                self.assertEqual(response.status_code, 200)
+
+        await self.assertSameResponse(BORROWING_URL, data={"cursor": "", "limit": 1})
+        await self.assertSameResponse(BOOK_URL, data={"limit": 2, "offset": 1})
+
+    async def test_reads_stay_in_the_event_loop(self):
+        with mock.patch.object(
+            BookViewSet, "list", side_effect=AssertionError
+        ), mock.patch.object(
+            BorrowingViewSet, "retrieve", side_effect=AssertionError
+        ), mock.patch.object(ManageUserView, "get", side_effect=AssertionError):
+            for url in (
+                BOOK_URL,
+                detail_url(BORROWING_URL, self.borrowing.id),
+                ME_URL,
+            ):
+                response = await self.async_get(url)
+                self.assertEqual(response.status_code, 200)
+
+    async def test_authentication_errors_match_sync_views(self):
+        for url in (BORROWING_URL, ME_URL):
+            with self.subTest(url=url):
+                response = await self.async_get(url, token=False)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(
+                    response["WWW-Authenticate"], 'Bearer realm="api"'
+                )
+
+                await self.assertSameResponse(url, Authorization="Bearer nope")
+
+    async def test_rejected_tokens_match_sync_views(self):
+        inactive = await User.objects.acreate(
+            email="inactive@test.com", is_active=False
+        )
+        deleted = await User.objects.acreate(email="deleted@test.com")
+        deleted_token = str(AccessToken.for_user(deleted))
+        await deleted.adelete()
+
+        for token in (
+            str(AccessToken.for_user(inactive)),
+            deleted_token,
+            self.token[:-2],
+        ):
+            for url in (BORROWING_URL, ME_URL):
+                with self.subTest(url=url, token=token):
+                    response = await self.assertSameResponse(
+                        url, Authorization=f"Bearer {token}"
+                    )
+                    self.assertEqual(response.status_code, 401)
+
+    async def test_missing_objects_are_404(self):
+        for url in (BOOK_URL, BORROWING_URL):
+            response = await self.assertSameResponse(detail_url(url, 0))
+            self.assertEqual(response.status_code, 404)
+
+    async def test_unchanged_resources_return_304(self):
+        for url in (BOOK_URL, detail_url(BORROWING_URL, self.borrowing.id)):
+            response = await self.async_get(url)
+            revalidated = await self.async_get(
+                url, **{"If-None-Match": response["ETag"]}
+            )
+
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated["ETag"], response["ETag"])
+
+    async def test_catalog_cache_is_shared_with_sync_views(self):
+        await sync_to_async(self.client.get)(BOOK_URL)
+
+        response = await self.async_get(BOOK_URL)
+
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    async def test_writes_go_to_sync_views(self):
+        with override_settings(ROOT_URLCONF=ASGI_URLS):
+            response = await self.async_client.post(
+                BORROWING_URL,
+                {
+                    "book": self.books[2].id,
+                    "expected_return_date": date.today() + timedelta(days=3),
+                },
+                content_type="application/json",
+                headers=self.headers(),
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            await Borrowing.objects.filter(
+                user=self.user, book=self.books[2]
+            ).aexists()
+        )
+
+    async def test_throttles_apply(self):
+        with mock.patch.dict(UserRateThrottle.THROTTLE_RATES, {"user": "2/day"}):
+            statuses = [(await self.async_get(ME_URL)).status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+    async def test_throttled_responses_match_sync_views(self):
+        with mock.patch.dict(UserRateThrottle.THROTTLE_RATES, {"user": "1/day"}):
+            for url in (BOOK_URL, BORROWING_URL, ME_URL):
+                with self.subTest(url=url):
+                    cache.clear()
+                    await sync_to_async(self.client.get)(
+                        url, headers=self.headers()
+                    )
+                    expected = await sync_to_async(self.client.get)(
+                        url, headers=self.headers()
+                    )
+                    cache.clear()
+                    await self.async_get(url)
+                    response = await self.async_get(url)
+
+                    self.assertEqual(expected.status_code, 429)
+                    self.assertEqual(response.status_code, 429)
+                    self.assertEqual(response.content, expected.content)
+                    self.assertEqual(response["Retry-After"], expected["Retry-After"])
@@ -0,0 +1,91 @@
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from library.benchmarks import compare
+from library.models import Book, Borrowing
+from library.seeding import PASSWORD
+from user.models import User
+
+
+class SeedDataTests(TestCase):
+
+    def seed(self, *args):
+        out = StringIO()
+        call_command(
+            "seed_data",
+            "--books", "50",
+            "--users", "20",
+            "--borrowings", "500",
+            "--batch-size", "200",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_seeds_consistent_rows(self):
+        output = self.seed()
+
+        self.assertIn("Seeded 20 users, 50 books and 500 borrowings", output)
+        self.assertIn("borrowings: 400/500", output)
+        self.assertEqual(Borrowing.objects.count(), 500)
+        today = date.today()
+        for borrowing in Borrowing.objects.all():
+            self.assertLessEqual(borrowing.borrow_date, today)
+            self.assertGreater(borrowing.expected_return_date, borrowing.borrow_date)
+            if borrowing.actual_return_date:
+                self.assertLessEqual(borrowing.actual_return_date, today)
+        self.assertTrue(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+        self.assertTrue(User.objects.first().check_password(PASSWORD))
+
+    def test_equal_seeds_give_equal_data(self):
+        columns = ("borrow_date", "expected_return_date", "actual_return_date")
+        self.seed("--seed", "0.5")
+        first = list(Borrowing.objects.order_by("id").values_list(*columns))
+        self.seed("--seed", "0.5")
+
+        second = list(Borrowing.objects.order_by("id").values_list(*columns))
+        self.assertEqual(second[500:], first)
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Book.objects.count(), 100)
+
+    def test_other_databases_are_a_command_error(self):
+        with mock.patch("library.seeding.connection.vendor", "sqlite"):
+            with self.assertRaisesMessage(CommandError, "Seeding needs PostgreSQL."):
+                self.seed()
+
+        self.assertFalse(User.objects.exists())
+
+
+class CompareTests(TestCase):
+
+    def test_regressions_follow_the_metric_direction(self):
+        baseline = {"browse": {"requests/s": 100, "p99 ms": 10, "queries": 2}}
+        results = {
+            "browse": {
+                "requests/s": 70,
+                "p99 ms": 10.5,
+                "queries": 3,
+                "catalog size": 5,
+            },
+            "new": {"requests/s": 1},
+        }
+
+        rows = {
+            metric: (round(change, 1), regressed)
+            for _, metric, _, _, change, regressed in compare(baseline, results, 20)
+        }
+
+        self.assertEqual(
+            rows,
+            {
+                "requests/s": (-30.0, True),
+                "p99 ms": (5.0, False),
+                "queries": (50.0, True),
+            },
+        )
@@ -1,7 +1,11 @@
-from django.test import TestCase
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from library import cache as catalog
 from library.models import Book, Cover
 from user.models import User
 
@@ -90,3 +94,121 @@ class BookTests(TestCase):
         response = self.client.post(BOOK_URL, payload, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class BookCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.admin_user = User.objects.create_user(
+            email="admin@test.com",
+            password="adminpass123",
+            is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=5,
+            cover=Cover.SOFT,
+            daily_fee=2.50
+        )
+        self.detail_url = f"{BOOK_URL}{self.book.id}/"
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.assertEqual(self.client.get(BOOK_URL)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.detail_url)["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            listed = self.client.get(BOOK_URL)
+            detail = self.client.get(self.detail_url)
+
+        self.assertEqual(listed["X-Cache"], "HIT")
+        self.assertEqual(listed.data["results"][0]["title"], "Test Book")
+        self.assertEqual(detail["X-Cache"], "HIT")
+        self.assertEqual(detail.data["inventory"], 5)
+
+    def test_query_params_are_cached_separately(self):
+        self.client.get(BOOK_URL)
+
+        response = self.client.get(f"{BOOK_URL}?offset=1")
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"], [])
+
+    def test_schemes_are_cached_separately(self):
+        Book.objects.create(
+            title="Other Book",
+            author="Test Author",
+            inventory=1,
+            cover=Cover.SOFT,
+            daily_fee=1.00
+        )
+        self.client.get(BOOK_URL, {"limit": 1})
+
+        response = self.client.get(BOOK_URL, {"limit": 1}, secure=True)
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertTrue(response.data["next"].startswith("https://"))
+
+    def test_checkout_and_return_refresh_inventory(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(BOOK_URL)
+        self.client.get(self.detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/library/borrowings/",
+                {
+                    "book": self.book.id,
+                    "expected_return_date": (
+                        date.today() + timedelta(days=7)
+                    ).isoformat(),
+                },
+                format="json",
+            )
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 4)
+        self.assertEqual(self.client.get(BOOK_URL)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"/api/library/borrowings/{response.data['id']}/return_book/"
+            )
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 5)
+
+    def test_new_book_refreshes_lists(self):
+        self.client.get(BOOK_URL)
+        self.client.force_authenticate(user=self.admin_user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                BOOK_URL,
+                {
+                    "title": "New Book",
+                    "author": "New Author",
+                    "inventory": 10,
+                    "cover": Cover.HARD,
+                    "daily_fee": 3.00
+                },
+                format="json",
+            )
+
+        response = self.client.get(BOOK_URL)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 2)
+
+    def test_hits_and_misses_are_counted(self):
+        before = dict(catalog.stats)
+
+        for _ in range(3):
+            self.client.get(self.detail_url)
+
+        self.assertEqual(catalog.stats["misses"] - before.get("misses", 0), 1)
+        self.assertEqual(catalog.stats["hits"] - before.get("hits", 0), 2)
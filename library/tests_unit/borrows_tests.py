@@ -1,10 +1,17 @@
+import json
+import tracemalloc
 from datetime import date, timedelta
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from library.models import Book, Borrowing, Cover
+from library.models import Book, Borrowing, Cover, Notification, OutboxEvent
+from library.tasks import relay_outbox
 from user.models import User
 
 
@@ -45,6 +52,22 @@ class BorrowingCreationTests(TestCase):
         self.book.refresh_from_db()
         self.assertEqual(self.book.inventory, initial_inventory - 1)
 
+    def test_create_borrowing_writes_outbox_event(self):
+        self.client.force_authenticate(user=self.user)
+
+        payload = {
+            "book": self.book.id,
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat()
+        }
+
+        with mock.patch("library.tasks.send_notification.delay") as delay:
+            response = self.client.post(BORROWING_URL, payload, format="json")
+
+        delay.assert_not_called()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.topic, "borrowing.created")
+        self.assertEqual(event.payload, {"borrowing_id": response.data["id"]})
+
     def test_create_borrowing_sets_user_automatically(self):
         self.client.force_authenticate(user=self.user)
 
@@ -81,6 +104,19 @@ class BorrowingCreationTests(TestCase):
         self.assertIn("error", response.data)
         self.assertEqual(response.data["error"], "Book not available")
 
+    def test_cannot_borrow_missing_book(self):
+        self.client.force_authenticate(user=self.user)
+
+        payload = {
+            "book": self.book.id + 1,
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat()
+        }
+
+        response = self.client.post(BORROWING_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Borrowing.objects.count(), 0)
+
     def test_anonymous_user_cannot_create_borrowing(self):
         expected_return = date.today() + timedelta(days=7)
 
@@ -94,6 +130,108 @@ class BorrowingCreationTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class BorrowingBulkCreateTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                inventory=2,
+                cover=Cover.SOFT,
+                daily_fee=1.00
+            )
+            for i in range(10)
+        ]
+        self.expected_return = (date.today() + timedelta(days=14)).isoformat()
+
+    def bulk_checkout(self, book_ids):
+        payload = {
+            "books": book_ids,
+            "expected_return_date": self.expected_return
+        }
+        return self.client.post(f"{BORROWING_URL}bulk/", payload, format="json")
+
+    def test_bulk_checkout_creates_borrowings(self):
+        book_ids = [book.id for book in self.books[:3]]
+
+        response = self.bulk_checkout(book_ids)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["created"]), 3)
+        self.assertEqual(response.data["failed"], [])
+        self.assertEqual(
+            Borrowing.objects.filter(user=self.user).count(), 3
+        )
+        for book in self.books[:3]:
+            book.refresh_from_db()
+            self.assertEqual(book.inventory, 1)
+
+    def test_bulk_checkout_reports_unavailable_books(self):
+        book = self.books[0]
+        missing_id = self.books[-1].id + 1
+
+        response = self.bulk_checkout([book.id, book.id, book.id, missing_id])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["created"]), 2)
+        self.assertEqual(
+            response.data["failed"],
+            [
+                {"book": book.id, "error": "Book not available"},
+                {"book": missing_id, "error": "Book not available"},
+            ]
+        )
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_bulk_checkout_nothing_available(self):
+        Book.objects.update(inventory=0)
+
+        response = self.bulk_checkout([self.books[0].id])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Borrowing.objects.count(), 0)
+
+    def test_bulk_checkout_query_count_is_constant(self):
+        with self.assertNumQueries(6):
+            self.bulk_checkout([book.id for book in self.books[:2]])
+        with self.assertNumQueries(6):
+            self.bulk_checkout([book.id for book in self.books])
+
+    def test_bulk_checkout_writes_one_outbox_event(self):
+        response = self.bulk_checkout([book.id for book in self.books[:5]])
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.topic, "borrowing.bulk_created")
+        self.assertEqual(
+            event.payload["borrowing_ids"],
+            [b["id"] for b in response.data["created"]]
+        )
+        self.assertFalse(Notification.objects.exists())
+
+    @mock.patch("library.tasks.send_borrowing_summary.delay")
+    def test_relayed_bulk_checkout_sends_one_notification_task(self, delay):
+        self.bulk_checkout([book.id for book in self.books[:5]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+
+        delay.assert_called_once()
+        (notification_ids,), _ = delay.call_args
+        self.assertEqual(len(notification_ids), 5)
+        self.assertEqual(
+            Notification.objects.filter(type="NEW_BORROWING").count(), 5
+        )
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
 class BorrowingReturnTests(TestCase):
 
     def setUp(self):
@@ -158,16 +296,144 @@ class BorrowingReturnTests(TestCase):
         self.assertIn("error", response.data)
         self.assertEqual(response.data["error"], "Already returned")
 
-    def test_return_book_with_get_method(self):
+    def test_return_book_with_get_method_not_allowed(self):
 
         response = self.client.get(
             f"{BORROWING_URL}{self.borrowing.id}/return_book/"
         )
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
         self.borrowing.refresh_from_db()
-        self.assertIsNotNone(self.borrowing.actual_return_date)
+        self.assertIsNone(self.borrowing.actual_return_date)
+
+    def test_return_missing_borrowing(self):
+
+        response = self.client.post(
+            f"{BORROWING_URL}{self.borrowing.id + 1}/return_book/"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_return_book_query_count(self):
+
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                f"{BORROWING_URL}{self.borrowing.id}/return_book/"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BorrowingBulkReturnTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                inventory=0,
+                cover=Cover.SOFT,
+                daily_fee=1.00
+            )
+            for i in range(2)
+        ]
+        self.borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=self.books[i % 2],
+                expected_return_date=date.today() + timedelta(days=7)
+            )
+            for i in range(20)
+        ]
+
+    def bulk_return(self, ids):
+        return self.client.post(
+            f"{BORROWING_URL}bulk_return/", {"ids": ids}, format="json"
+        )
+
+    def test_bulk_return_restocks_books(self):
+        response = self.bulk_return([b.id for b in self.borrowings])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"].values()), {"returned"})
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+        for book in self.books:
+            book.refresh_from_db()
+            self.assertEqual(book.inventory, 10)
+
+    def test_bulk_return_reports_each_id(self):
+        returned = self.borrowings[0]
+        returned.actual_return_date = date.today()
+        returned.save()
+        missing_id = self.borrowings[-1].id + 1
+
+        response = self.bulk_return(
+            [returned.id, self.borrowings[1].id, missing_id]
+        )
+
+        self.assertEqual(
+            response.data["results"],
+            {
+                returned.id: "already_returned",
+                self.borrowings[1].id: "returned",
+                missing_id: "not_found",
+            }
+        )
+        self.books[1].refresh_from_db()
+        self.assertEqual(self.books[1].inventory, 1)
+
+    def test_bulk_return_only_returns_own_borrowings(self):
+        other = User.objects.create_user(
+            email="other@test.com",
+            password="testpass123"
+        )
+        others = Borrowing.objects.create(
+            user=other,
+            book=self.books[0],
+            expected_return_date=date.today() + timedelta(days=7)
+        )
+        returned = Borrowing.objects.create(
+            user=other,
+            book=self.books[1],
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=date.today(),
+        )
+
+        response = self.bulk_return([others.id, returned.id, self.borrowings[0].id])
+
+        self.assertEqual(
+            response.data["results"],
+            {
+                others.id: "not_found",
+                returned.id: "not_found",
+                self.borrowings[0].id: "returned",
+            }
+        )
+        others.refresh_from_db()
+        self.assertIsNone(others.actual_return_date)
+
+        self.client.force_authenticate(user=User.objects.create_user(
+            email="admin@test.com",
+            password="testpass123",
+            is_staff=True
+        ))
+        response = self.bulk_return([others.id])
+        self.assertEqual(response.data["results"], {others.id: "returned"})
+
+    def test_bulk_return_query_count_is_constant(self):
+        with self.assertNumQueries(5):
+            self.bulk_return([b.id for b in self.borrowings[:2]])
+        with self.assertNumQueries(5):
+            self.bulk_return([b.id for b in self.borrowings[2:]])
 
 
 class BorrowingListTests(TestCase):
@@ -232,3 +498,162 @@ class BorrowingListTests(TestCase):
         self.assertEqual(len(response.data["results"]), 2)
         self.assertEqual(response.data["results"][0]["id"], borrowing2.id)
         self.assertEqual(response.data["results"][1]["id"], borrowing1.id)
+
+    def test_list_is_scoped_to_requesting_user(self):
+        own = Borrowing.objects.create(
+            user=self.user1,
+            book=self.book1,
+            expected_return_date=date.today() + timedelta(days=3)
+        )
+        Borrowing.objects.create(
+            user=self.user2,
+            book=self.book2,
+            expected_return_date=date.today() + timedelta(days=3)
+        )
+
+        response = self.client.get(BORROWING_URL)
+
+        self.assertEqual([b["id"] for b in response.data["results"]], [own.id])
+
+    def test_staff_lists_all_borrowings(self):
+        for user in (self.user1, self.user2):
+            Borrowing.objects.create(
+                user=user,
+                book=self.book1,
+                expected_return_date=date.today() + timedelta(days=3)
+            )
+        self.client.force_authenticate(
+            user=User.objects.create_user(
+                email="admin@test.com",
+                password="adminpass123",
+                is_staff=True
+            )
+        )
+
+        response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.data["count"], 2)
+
+    def test_list_query_count_is_constant(self):
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user=self.user1,
+                book=(self.book1, self.book2)[i % 2],
+                expected_return_date=date.today() + timedelta(days=i)
+            )
+            for i in range(30)
+        )
+
+        for limit in (1, 5, 30):
+            with self.assertNumQueries(2):
+                response = self.client.get(f"{BORROWING_URL}?limit={limit}")
+            self.assertEqual(len(response.data["results"]), limit)
+
+    def test_list_fetches_only_serialized_columns(self):
+        Borrowing.objects.create(
+            user=self.user1,
+            book=self.book1,
+            expected_return_date=date.today() + timedelta(days=3)
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(BORROWING_URL)
+
+        page_query = queries.captured_queries[-1]["sql"]
+        self.assertIn('"library_book"."title"', page_query)
+        self.assertNotIn("password", page_query)
+        self.assertNotIn("daily_fee", page_query)
+
+
+class BorrowingExportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.admin_user = User.objects.create_user(
+            email="admin@test.com",
+            password="adminpass123",
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=0,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+
+    def seed(self, count, user=None, returned=False):
+        return Borrowing.objects.bulk_create(
+            Borrowing(
+                user=user or self.user,
+                book=self.book,
+                expected_return_date=date.today() + timedelta(days=7),
+                actual_return_date=date.today() if returned else None,
+            )
+            for _ in range(count)
+        )
+
+    def export(self, query=""):
+        response = self.client.get(f"{BORROWING_URL}export/{query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_export_is_staff_only(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(f"{BORROWING_URL}export/")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_ndjson_export_filters(self):
+        [open_borrowing] = self.seed(1)
+        self.seed(2, returned=True)
+        self.seed(1, user=self.admin_user)
+
+        lines = self.export(f"?status=open&user={self.user.id}")
+
+        [row] = [json.loads(line) for line in lines]
+        self.assertEqual(row["id"], open_borrowing.id)
+        self.assertEqual(row["book_title"], "Test Book")
+        self.assertEqual(row["user_email"], "user@test.com")
+        self.assertIsNone(row["actual_return_date"])
+
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.export(f"?borrowed_before={date.today()}")), 4)
+        self.assertEqual(self.export(f"?borrowed_after={tomorrow}"), [])
+
+    def test_csv_export(self):
+        self.seed(3)
+
+        lines = self.export("?output=csv")
+
+        self.assertEqual(lines[0].split(",")[:3], ["id", "book", "book_title"])
+        self.assertEqual(len(lines), 4)
+
+    def peak_memory(self, rows):
+        Borrowing.objects.all().delete()
+        self.seed(rows)
+
+        tracemalloc.start()
+        try:
+            response = self.client.get(f"{BORROWING_URL}export/")
+            exported = sum(
+                chunk.count(b"\n") for chunk in response.streaming_content
+            )
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(exported, rows)
+        return peak
+
+    @mock.patch("library.export.CHUNK_SIZE", 500)
+    def test_export_memory_does_not_grow_with_rows(self):
+        small = self.peak_memory(2000)
+        large = self.peak_memory(20000)
+
+        self.assertLess(large, small * 1.5)
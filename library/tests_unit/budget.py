@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Fail a test when a block runs more queries than it is allowed."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget, label=""):
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        if len(captured) > budget:
+            queries = "\n".join(
+                f"{i}. {query['sql']}"
+                for i, query in enumerate(captured.captured_queries, start=1)
+            )
+            self.fail(
+                f"{label or 'Block'} ran {len(captured)} queries, "
+                f"over its budget of {budget}:\n{queries}"
+            )
@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Cover
+from library.serializers import BookListSerializer, BorrowingListSerializer
+from user.models import User
+
+
+BOOK_URL = "/api/library/books/"
+BORROWING_URL = "/api/library/borrowings/"
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class ColumnListTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.admin = User.objects.create_user(
+            email="admin@test.com",
+            password="testpass123",
+            is_staff=True
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                inventory=5,
+                cover=Cover.HARD,
+                daily_fee=1.00
+            )
+            for i in range(3)
+        ]
+        for i in range(6):
+            Borrowing.objects.create(
+                user=self.user if i % 2 else self.admin,
+                book=self.books[i % 3],
+                expected_return_date=date.today() + timedelta(days=i % 3),
+                actual_return_date=date.today() if i % 3 == 0 else None,
+            )
+
+    def test_book_list_matches_serializer(self):
+        response = self.client.get(BOOK_URL, {"limit": 100})
+
+        self.assertEqual(
+            response.data["results"],
+            BookListSerializer(Book.objects.all(), many=True).data,
+        )
+
+    def test_borrowing_list_matches_serializer(self):
+        for user, borrowings in (
+            (self.admin, Borrowing.objects.all()),
+            (self.user, Borrowing.objects.filter(user=self.user)),
+        ):
+            self.client.force_authenticate(user=user)
+            response = self.client.get(BORROWING_URL, {"limit": 100})
+
+            self.assertEqual(
+                response.data["results"],
+                BorrowingListSerializer(borrowings, many=True).data,
+            )
+
+    def test_keyset_pages_match_serializer(self):
+        self.client.force_authenticate(user=self.admin)
+        expected = BorrowingListSerializer(Borrowing.objects.all(), many=True).data
+
+        results = []
+        response = self.client.get(BORROWING_URL, {"cursor": "", "limit": 4})
+        results += response.data["results"]
+        response = self.client.get(response.data["next"])
+        results += response.data["results"]
+
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(results, expected)
+
+    def test_list_builds_no_model_instances(self):
+        self.client.force_authenticate(user=self.admin)
+
+        with mock.patch.object(Book, "from_db") as books, mock.patch.object(
+            Borrowing, "from_db"
+        ) as borrowings:
+            self.client.get(BOOK_URL)
+            self.client.get(BORROWING_URL)
+
+        books.assert_not_called()
+        borrowings.assert_not_called()
+
+    def test_count_does_not_join_related_columns(self):
+        self.client.force_authenticate(user=self.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(BORROWING_URL)
+
+        count = next(q["sql"] for q in queries if "COUNT(*)" in q["sql"])
+        self.assertNotIn("JOIN", count)
@@ -0,0 +1,105 @@
+import threading
+from datetime import date, timedelta
+
+from django.db import connections
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Cover
+from user.models import User
+
+
+BORROWING_URL = "/api/library/borrowings/"
+
+
+def run_concurrently(func, count):
+    """Call ``func`` from ``count`` threads released at the same moment."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        try:
+            barrier.wait()
+            results[index] = func()
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            inventory=5,
+            cover=Cover.HARD,
+            daily_fee=1.99
+        )
+
+    def checkout(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        payload = {
+            "book": self.book.id,
+            "expected_return_date": (date.today() + timedelta(days=7)).isoformat()
+        }
+        return client.post(BORROWING_URL, payload, format="json").status_code
+
+    def test_concurrent_checkouts_never_oversell(self):
+        codes = run_concurrently(self.checkout, 20)
+
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 5)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), 15)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.filter(book=self.book).count(), 5)
+
+
+class ConcurrentReturnTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            inventory=0,
+            cover=Cover.HARD,
+            daily_fee=1.99
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7)
+        )
+
+    def return_book(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        return client.post(
+            f"{BORROWING_URL}{self.borrowing.id}/return_book/"
+        ).status_code
+
+    def test_concurrent_returns_restock_once(self):
+        codes = run_concurrently(self.return_book, 10)
+
+        self.assertEqual(codes.count(status.HTTP_200_OK), 1)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), 9)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Cover
+from library.serializers import BorrowingListSerializer
+from user.models import User
+
+
+BOOK_URL = "/api/library/books/"
+BORROWING_URL = "/api/library/borrowings/"
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=5,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_borrowings_return_304_without_serializing(self):
+        response = self.client.get(BORROWING_URL)
+
+        with mock.patch.object(
+            BorrowingListSerializer, "to_representation"
+        ) as to_representation, self.assertNumQueries(2):
+            revalidated = self.revalidate(BORROWING_URL, response)
+
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated.content, b"")
+        self.assertEqual(revalidated["ETag"], response["ETag"])
+        to_representation.assert_not_called()
+
+    def test_if_modified_since(self):
+        response = self.client.get(f"{BORROWING_URL}{self.borrowing.id}/")
+
+        revalidated = self.client.get(
+            f"{BORROWING_URL}{self.borrowing.id}/",
+            HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+        )
+
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_return_changes_borrowing_validators(self):
+        url = f"{BORROWING_URL}{self.borrowing.id}/"
+        listed = self.client.get(BORROWING_URL)
+        detail = self.client.get(url)
+
+        self.client.post(f"{url}return_book/")
+
+        self.assertEqual(
+            self.revalidate(BORROWING_URL, listed).status_code, status.HTTP_200_OK
+        )
+        self.assertEqual(self.revalidate(url, detail).status_code, status.HTTP_200_OK)
+
+    def test_joined_columns_change_list_validators(self):
+        listed = self.client.get(BORROWING_URL)
+        # Users have no updated_at, so the list cannot tell when it changed.
+        self.assertNotIn("Last-Modified", listed)
+
+        Book.objects.filter(id=self.book.id).update(title="Renamed")
+        renamed = self.revalidate(BORROWING_URL, listed)
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+        self.assertEqual(renamed.data["results"][0]["book_title"], "Renamed")
+
+        User.objects.filter(id=self.user.id).update(email="new@test.com")
+        self.assertEqual(
+            self.revalidate(BORROWING_URL, renamed).status_code, status.HTTP_200_OK
+        )
+
+    def test_deletion_changes_list_validators(self):
+        Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=1),
+        )
+        listed = self.client.get(BORROWING_URL)
+
+        self.borrowing.delete()
+
+        self.assertEqual(
+            self.revalidate(BORROWING_URL, listed).status_code, status.HTTP_200_OK
+        )
+
+    def test_cached_book_revalidates_until_checkout(self):
+        url = f"{BOOK_URL}{self.book.id}/"
+        detail = self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        with self.assertNumQueries(0):
+            revalidated = self.revalidate(url, detail)
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                BORROWING_URL,
+                {
+                    "book": self.book.id,
+                    "expected_return_date": (
+                        date.today() + timedelta(days=7)
+                    ).isoformat(),
+                },
+                format="json",
+            )
+
+        refreshed = self.revalidate(url, detail)
+        self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+        self.assertEqual(refreshed.data["inventory"], 4)
+        self.assertNotEqual(refreshed["ETag"], detail["ETag"])
@@ -0,0 +1,20 @@
+from django.db import connection
+
+
+class ExplainMixin:
+    """Assertions on the query plan Postgres picks for a queryset."""
+
+    def analyze(self, *models):
+        with connection.cursor() as cursor:
+            for model in models:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def assertNoSeqScan(self, queryset, *models):
+        """Fail if the plan reads any of ``models`` with a sequential scan."""
+        plan = queryset.explain()
+        for model in models or (queryset.model,):
+            self.assertNotIn(
+                f"Seq Scan on {model._meta.db_table}",
+                plan,
+                msg=f"\n{queryset.query}\n{plan}",
+            )
@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Charge, Cover
+from library.tasks import run_billing
+from user.models import User
+
+
+BORROWING_URL = "/api/library/borrowings/"
+
+
+@override_settings(FINE_MULTIPLIER=2)
+class FeeEngineTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=Decimal("1.50")
+        )
+        self.today = date.today()
+
+    def borrow(self, borrowed, due, returned=None, user=None):
+        """Create a borrowing; dates are day offsets from today."""
+        borrowing = Borrowing.objects.create(
+            user=user or self.user,
+            book=self.book,
+            expected_return_date=self.today + timedelta(days=due),
+            actual_return_date=(
+                None if returned is None else self.today + timedelta(days=returned)
+            ),
+        )
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=self.today + timedelta(days=borrowed)
+        )
+        return borrowing
+
+    def fees(self, borrowing):
+        row = Borrowing.objects.with_fees().get(pk=borrowing.pk)
+        return row.base_fee, row.overdue_fee, row.total_fee
+
+    def test_on_time_borrowing_pays_base_fee_only(self):
+        borrowing = self.borrow(-10, -3, returned=-4)
+
+        self.assertEqual(
+            self.fees(borrowing), (Decimal("10.50"), 0, Decimal("10.50"))
+        )
+
+    def test_late_return_is_fined_per_day(self):
+        borrowing = self.borrow(-10, -5, returned=-2)
+
+        self.assertEqual(
+            self.fees(borrowing), (Decimal("7.50"), Decimal("9.00"), Decimal("16.50"))
+        )
+
+    def test_open_overdue_borrowing_accrues_until_today(self):
+        borrowing = self.borrow(-10, -4)
+
+        self.assertEqual(self.fees(borrowing)[1], Decimal("12.00"))
+        later = Borrowing.objects.with_fees(self.today + timedelta(days=1))
+        self.assertEqual(later.get(pk=borrowing.pk).overdue_fee, Decimal("15.00"))
+
+    def test_per_user_totals_in_one_query(self):
+        other = User.objects.create_user(email="other@test.com", password="x")
+        self.borrow(-10, -3, returned=-4)
+        self.borrow(-10, -5, returned=-2)
+        self.borrow(-2, 5, user=other)
+
+        with self.assertNumQueries(1):
+            totals = {
+                row["user"]: row["total"] for row in Borrowing.objects.fee_totals()
+            }
+
+        self.assertEqual(
+            totals, {self.user.id: Decimal("27.00"), other.id: Decimal("10.50")}
+        )
+
+    def test_fees_are_exposed_on_the_api(self):
+        borrowing = self.borrow(-10, -5, returned=-2)
+
+        detail = self.client.get(f"{BORROWING_URL}{borrowing.id}/")
+        owed = self.client.get(f"{BORROWING_URL}fees/")
+
+        self.assertEqual(detail.data["total_fee"], "16.50")
+        self.assertEqual(
+            owed.data, {"base": "7.50", "overdue": "9.00", "total": "16.50"}
+        )
+
+    def test_billing_run_writes_charges_once_per_day(self):
+        open_borrowing = self.borrow(-10, -4)
+        recent = self.borrow(-10, -5, returned=-2)
+        old = self.borrow(-100, -90, returned=-80)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(run_billing(), 2)
+        self.assertEqual(run_billing(), 2)
+
+        charges = {c.borrowing_id: c for c in Charge.objects.all()}
+        self.assertEqual(set(charges), {open_borrowing.id, recent.id})
+        self.assertEqual(charges[recent.id].total_fee, Decimal("16.50"))
+        self.assertEqual(charges[open_borrowing.id].billed_on, self.today)
+        self.assertNotIn(old.id, charges)
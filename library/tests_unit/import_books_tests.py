@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from library.models import Book, Cover
+
+
+class ImportBooksTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.rejects = os.path.join(self.dir, "rejects.jsonl")
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def import_books(self, path, *args):
+        out = StringIO()
+        call_command(
+            "import_books", path, "--rejects", self.rejects, *args, stdout=out
+        )
+        return out.getvalue()
+
+    def read_rejects(self):
+        with open(self.rejects) as f:
+            return [json.loads(line) for line in f]
+
+    def test_csv_import_in_batches_with_rejects(self):
+        path = self.write(
+            "books.csv",
+            "title,author,inventory,cover,daily_fee\n"
+            "Dune,Frank Herbert,3,HARD,1.50\n"
+            "Emma,Jane Austen,2,,0.99\n"
+            "Bad,Author,-1,PAPER,1.00\n"
+            "Ulysses,James Joyce,1,SOFT,2.00\n",
+        )
+
+        output = self.import_books(path, "--batch-size", "2")
+
+        self.assertIn("Imported 3 books, rejected 1", output)
+        self.assertEqual(
+            list(Book.objects.values_list("title", "cover")),
+            [("Dune", Cover.HARD), ("Emma", Cover.SOFT), ("Ulysses", Cover.SOFT)],
+        )
+        [reject] = self.read_rejects()
+        self.assertEqual(reject["line"], 4)
+        self.assertEqual(set(reject["errors"]), {"inventory", "cover"})
+
+    def test_jsonl_rows_with_id_update_that_book(self):
+        book = Book.objects.create(
+            title="Old Title",
+            author="Author",
+            inventory=1,
+            cover=Cover.SOFT,
+            daily_fee=1
+        )
+        path = self.write(
+            "books.jsonl",
+            json.dumps({
+                "id": book.id,
+                "title": "New Title",
+                "author": "Author",
+                "inventory": 7,
+                "daily_fee": "2.00",
+            }) + "\nnot json\n",
+        )
+
+        self.import_books(path)
+
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.inventory), ("New Title", 7))
+        [reject] = self.read_rejects()
+        self.assertEqual(reject["errors"], {"row": ["Not a JSON object."]})
+
+    def test_repeated_ids_in_a_batch_keep_the_last_row(self):
+        book = {"author": "Author", "inventory": 1, "daily_fee": "1.00"}
+        rows = [
+            {"id": 50, "title": "First", **book},
+            {"title": "New", **book},
+            {"id": 50, "title": "Last", **book},
+        ]
+        path = self.write(
+            "books.jsonl", "".join(json.dumps(row) + "\n" for row in rows)
+        )
+
+        output = self.import_books(path)
+
+        self.assertIn("Imported 3 books, rejected 0", output)
+        self.assertEqual(Book.objects.get(id=50).title, "Last")
+        self.assertGreater(Book.objects.get(title="New").id, 50)
+
+    def test_rows_without_id_skip_ids_imported_earlier(self):
+        path = self.write(
+            "books.csv",
+            "id,title,author,inventory,cover,daily_fee\n"
+            "7,Dune,Frank Herbert,3,HARD,1.50\n"
+            ",Emma,Jane Austen,2,,0.99\n"
+            "20,Ulysses,James Joyce,1,SOFT,2.00\n"
+            ",Beloved,Toni Morrison,1,SOFT,2.00\n",
+        )
+
+        self.import_books(path, "--batch-size", "2")
+
+        self.assertEqual(Book.objects.count(), 4)
+        emma, beloved = (
+            Book.objects.get(title=title).id for title in ("Emma", "Beloved")
+        )
+        self.assertGreater(emma, 7)
+        self.assertGreater(beloved, 20)
+        book = Book.objects.create(
+            title="Next", author="Author", inventory=1, daily_fee=1
+        )
+        self.assertEqual(book.id, beloved + 1)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write(
+            "books.csv",
+            "title,author,inventory,cover,daily_fee\nDune,Frank Herbert,3,HARD,1.50\n",
+        )
+
+        output = self.import_books(path, "--dry-run")
+
+        self.assertIn("Validated 1 books, rejected 0", output)
+        self.assertFalse(Book.objects.exists())
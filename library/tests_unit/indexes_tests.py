@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+
+from library.models import Book, Borrowing, Cover, Notification
+from library.pagination import keyset_filter
+from library.tasks import overdue_borrowings
+from library.tests_unit.explain import ExplainMixin
+from library.views import BorrowingViewSet
+from user.models import User
+
+
+class HotQueryPlanTests(ExplainMixin, TestCase):
+    """The hot queries must stay on indexes once the tables are large."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        users = User.objects.bulk_create(
+            User(email=f"user{i}@test.com", password="x") for i in range(200)
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Book {i}",
+                author="Author",
+                inventory=10,
+                cover=Cover.SOFT,
+                daily_fee=1,
+            )
+            for i in range(50)
+        )
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                user=users[i % len(users)],
+                book=books[i % len(books)],
+                expected_return_date=today + timedelta(days=i % 60 - 40),
+                actual_return_date=today if i % 20 else None,
+            )
+            for i in range(20000)
+        )
+        Notification.objects.bulk_create(
+            Notification(type="NEW_BORROWING", borrowing=borrowing, status="SENT")
+            for borrowing in borrowings
+        )
+        Notification.objects.bulk_create(
+            Notification(type="OVERDUE", borrowing=borrowing, status="SENT")
+            for borrowing in borrowings[::40]
+            if borrowing.expected_return_date < today
+        )
+        cls.user = users[0]
+        cls.borrowing = borrowings[0]
+        cls.today = today
+
+    def setUp(self):
+        self.analyze(Borrowing, Notification)
+
+    def test_borrowing_list_page(self):
+        self.assertNoSeqScan(BorrowingViewSet.queryset[:5])
+
+    def test_borrowing_keyset_page(self):
+        ordering = Borrowing._meta.ordering
+        position = [self.today.isoformat(), self.borrowing.pk]
+        self.assertNoSeqScan(
+            BorrowingViewSet.queryset.filter(keyset_filter(ordering, position))[:6]
+        )
+
+    def test_user_borrowing_list_page(self):
+        self.assertNoSeqScan(Borrowing.objects.filter(user=self.user)[:5])
+
+    def test_return_book_lookup(self):
+        self.assertNoSeqScan(
+            Borrowing.objects.filter(
+                pk=self.borrowing.pk, actual_return_date__isnull=True
+            )
+        )
+
+    def test_overdue_scan(self):
+        self.assertNoSeqScan(
+            overdue_borrowings(self.today), Borrowing, Notification
+        )
+
+    def test_notification_dedupe(self):
+        notifications = Notification.objects.filter(
+            type="OVERDUE", borrowing=self.borrowing, payment__isnull=True
+        )
+        self.assertNoSeqScan(notifications)
+        self.assertIn("notification_once_per_borrowing", notifications.explain())
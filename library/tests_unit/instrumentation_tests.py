@@ -0,0 +1,122 @@
+import re
+from datetime import date, timedelta
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Cover
+from library.tasks import check_overdue_borrowings
+from library.tests_unit.budget import QueryBudgetMixin
+from user.models import User
+
+
+BOOK_URL = "/api/library/books/"
+BORROWING_URL = "/api/library/borrowings/"
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class InstrumentationTestCase(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class QueryTimingMiddlewareTests(InstrumentationTestCase):
+
+    def test_responses_carry_server_timing(self):
+        response = self.client.get(BOOK_URL)
+
+        timing = response["Server-Timing"]
+        match = re.fullmatch(
+            r'db;dur=[\d.]+;desc="(\d+) queries", total;dur=[\d.]+', timing
+        )
+        self.assertIsNotNone(match, timing)
+        self.assertEqual(match.group(1), "2")
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_worst_queries(self):
+        with self.assertLogs("library.performance", "WARNING") as logs:
+            self.client.get(BOOK_URL)
+
+        message = logs.output[0]
+        self.assertIn("Slow request GET /api/library/books/ (200)", message)
+        self.assertIn("2 queries", message)
+        self.assertIn('FROM "library_book"', message)
+
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs("library.performance", "WARNING"):
+            self.client.get(BOOK_URL)
+
+    @override_settings(SLOW_TASK_MS=0)
+    def test_tasks_are_recorded(self):
+        with self.assertLogs("library.performance", "WARNING") as logs:
+            check_overdue_borrowings()
+
+        self.assertIn(
+            "Slow task library.tasks.check_overdue_borrowings", logs.output[0]
+        )
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class EndpointQueryBudgetTests(InstrumentationTestCase):
+    """
+    The most queries each endpoint may run; raise a budget only on purpose.
+
+    Counts include the savepoints of the test transaction.
+    """
+
+    def test_read_endpoints(self):
+        self.client.force_authenticate(user=self.user)
+        budgets = [
+            (BOOK_URL, 2),
+            (f"{BOOK_URL}{self.book.id}/", 1),
+            (BORROWING_URL, 2),
+            (f"{BORROWING_URL}{self.borrowing.id}/", 1),
+            (f"{BORROWING_URL}fees/", 1),
+        ]
+        for url, budget in budgets:
+            with self.subTest(url=url), self.assertQueryBudget(budget, url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_write_endpoints(self):
+        self.client.force_authenticate(user=self.user)
+        due = (date.today() + timedelta(days=7)).isoformat()
+        returning = Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date=due
+        )
+        budgets = [
+            (BORROWING_URL, {"book": self.book.id, "expected_return_date": due}, 6),
+            (
+                f"{BORROWING_URL}bulk/",
+                {"books": [self.book.id] * 3, "expected_return_date": due},
+                6,
+            ),
+            (f"{BORROWING_URL}{self.borrowing.id}/return_book/", {}, 5),
+            (f"{BORROWING_URL}bulk_return/", {"ids": [returning.id]}, 5),
+        ]
+        for url, payload, budget in budgets:
+            with self.subTest(url=url), self.assertQueryBudget(budget, url):
+                response = self.client.post(url, payload, format="json")
+                self.assertLess(response.status_code, 300)
+
+    def test_budget_failure_lists_the_queries(self):
+        with self.assertRaisesRegex(AssertionError, "over its budget of 0"):
+            with self.assertQueryBudget(0):
+                Book.objects.count()
@@ -0,0 +1,139 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from library import cache as catalog
+from library import metrics
+from library.models import Book, Borrowing, Cover, Notification
+from library.tasks import check_overdue_borrowings
+from user.models import User
+
+
+METRICS_URL = "/api/metrics/"
+BOOK_URL = "/api/library/books/"
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        for metric in metrics.registry:
+            metric.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.admin = User.objects.create_user(
+            email="admin@test.com",
+            password="testpass123",
+            is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+
+    def scrape(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(METRICS_URL)
+        self.client.force_authenticate(user=None)
+        return response.content.decode().splitlines()
+
+
+class MetricsEndpointTests(MetricsTestCase):
+
+    def test_metrics_require_staff(self):
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 401)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_requests_are_counted_by_view(self):
+        self.client.get(BOOK_URL)
+        self.client.get(BOOK_URL)
+
+        lines = self.scrape()
+
+        self.assertIn(
+            'library_http_requests_total{view="library:book-list",'
+            'method="GET",status="200"} 2',
+            lines,
+        )
+        self.assertIn(
+            'library_http_request_duration_seconds_count{view="library:book-list",'
+            'method="GET"} 2',
+            lines,
+        )
+        self.assertIn('library_db_queries_total{source="library:book-list"} 4', lines)
+
+    def test_notification_backlog_by_status(self):
+        due = date.today() - timedelta(days=1)
+        for status in ("PENDING", "PENDING", "FAILED", "SENT"):
+            borrowing = Borrowing.objects.create(
+                user=self.user, book=self.book, expected_return_date=due
+            )
+            Notification.objects.create(
+                type="OVERDUE", borrowing=borrowing, status=status
+            )
+
+        lines = self.scrape()
+
+        self.assertIn('library_notifications_unsent{status="PENDING"} 2', lines)
+        self.assertIn('library_notifications_unsent{status="SENDING"} 0', lines)
+        self.assertIn('library_notifications_unsent{status="FAILED"} 1', lines)
+
+    def test_catalog_cache_lookups(self):
+        cache.clear()
+        catalog.stats.clear()
+        self.client.get(BOOK_URL)
+        self.client.get(BOOK_URL)
+
+        lines = self.scrape()
+
+        self.assertIn('library_catalog_cache_requests_total{result="miss"} 1', lines)
+        self.assertIn('library_catalog_cache_requests_total{result="hit"} 1', lines)
+
+    def test_task_runs_are_timed(self):
+        check_overdue_borrowings()
+
+        lines = self.scrape()
+
+        self.assertIn(
+            "library_celery_task_duration_seconds_count"
+            '{task="library.tasks.check_overdue_borrowings"} 1',
+            lines,
+        )
+
+
+class HistogramTests(TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ["op"], buckets=(1, 5))
+        metrics.registry.remove(histogram)
+        for value in (0.5, 1, 3, 9):
+            histogram.observe(value, "read")
+
+        self.assertEqual(
+            histogram.samples(),
+            [
+                'test_seconds_bucket{op="read",le="1.0"} 2',
+                'test_seconds_bucket{op="read",le="5.0"} 3',
+                'test_seconds_bucket{op="read",le="+Inf"} 4',
+                'test_seconds_sum{op="read"} 13.5',
+                'test_seconds_count{op="read"} 4',
+            ],
+        )
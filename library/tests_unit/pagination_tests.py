@@ -0,0 +1,108 @@
+import base64
+import json
+from datetime import date, timedelta
+
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Cover
+from user.models import User
+
+
+BOOK_URL = "/api/library/books/"
+BORROWING_URL = "/api/library/borrowings/"
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=5,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+        # Several borrowings share a due date, so the id tiebreaker matters.
+        self.borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=self.book,
+                expected_return_date=date.today() + timedelta(days=i % 3),
+            )
+            for i in range(7)
+        ]
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            ids += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_cursor_walks_every_borrowing_once_in_order(self):
+        ids = self.walk(f"{BORROWING_URL}?cursor=&limit=2")
+
+        self.assertEqual(ids, list(Borrowing.objects.values_list("id", flat=True)))
+
+    def test_cursor_walks_books(self):
+        books = [self.book] + [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                inventory=1,
+                cover=Cover.SOFT,
+                daily_fee=1.00
+            )
+            for i in range(4)
+        ]
+
+        ids = self.walk(f"{BOOK_URL}?cursor=&limit=2")
+
+        self.assertEqual(ids, [book.id for book in books])
+
+    def test_offset_mode_is_unchanged(self):
+        response = self.client.get(f"{BORROWING_URL}?offset=5")
+
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+
+    def test_page_query_count_does_not_grow(self):
+        response = self.client.get(f"{BORROWING_URL}?cursor=&limit=2")
+
+        with self.assertNumQueries(1):
+            self.client.get(response.data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"{BORROWING_URL}?cursor=bogus")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        # Well-formed cursors whose values do not fit the ordering fields.
+        for url, position in (
+            (BORROWING_URL, ["not-a-date", 1]),
+            (BORROWING_URL, [str(date.today()), "abc"]),
+            (BORROWING_URL, [str(date.today()), {"id": 1}]),
+            (BORROWING_URL, [None, 1]),
+            (BORROWING_URL, [str(date.today()), 2**63]),
+            (BOOK_URL, ["abc"]),
+            (BOOK_URL, [[1]]),
+            (BOOK_URL, [None]),
+        ):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode())
+            with self.subTest(url=url, position=position):
+                response = self.client.get(url, {"cursor": cursor.decode()})
+
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,284 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from library.models import (
+    Book,
+    Borrowing,
+    Cover,
+    Notification,
+    Payment,
+    WebhookEvent,
+)
+from library.payments import PaymentClient
+from library.stripe_stub import StripeStub
+from library.tasks import (
+    create_payment_sessions,
+    create_payments,
+    process_webhook_events,
+    relay_outbox,
+    send_notifications,
+)
+from user.models import User
+
+
+WEBHOOK_URL = reverse("library:stripe-webhook")
+
+
+class PaymentTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.50
+        )
+
+    def borrow(self, days=4, returned_after=None):
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=days),
+        )
+        if returned_after is not None:
+            Borrowing.objects.filter(id=borrowing.id).update(
+                actual_return_date=borrowing.expected_return_date
+                + timedelta(days=returned_after)
+            )
+        return borrowing
+
+    def pay(self, borrowing, payment_type="PAYMENT"):
+        return Payment.objects.create(
+            borrowing=borrowing, type=payment_type, money_to_pay=Decimal("6.00")
+        )
+
+
+class PaymentCreationTests(PaymentTestCase):
+
+    @mock.patch("library.tasks.create_payment_sessions.delay")
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_relay_creates_base_fee_payments(self, send, create_sessions):
+        borrowing = self.borrow(days=4)
+        self.borrow(days=0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.borrowing, borrowing)
+        self.assertEqual(payment.type, "PAYMENT")
+        self.assertEqual(payment.money_to_pay, Decimal("6.00"))
+        create_sessions.assert_called_once_with([payment.id])
+
+    @override_settings(FINE_MULTIPLIER=2)
+    @mock.patch("library.tasks.create_payment_sessions.delay")
+    def test_fines_are_created_once_per_late_return(self, create_sessions):
+        late = self.borrow(days=-5, returned_after=3)
+        self.borrow(days=-5, returned_after=0)
+        self.borrow(days=-5)
+
+        self.assertEqual(create_payments(), 1)
+        self.assertEqual(create_payments(), 0)
+
+        fine = Payment.objects.get(type="FINE")
+        self.assertEqual(fine.borrowing, late)
+        self.assertEqual(fine.money_to_pay, Decimal("9.00"))
+        create_sessions.assert_called_once_with([fine.id])
+
+    @mock.patch("library.tasks.create_payment_sessions.delay")
+    def test_sweep_reopens_stalled_payments(self, create_sessions):
+        stalled = self.pay(self.borrow())
+        self.pay(self.borrow())
+        Payment.objects.filter(id=stalled.id).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(create_payments(), 1)
+
+        create_sessions.assert_called_once_with([stalled.id])
+
+    @mock.patch("library.tasks.create_payment_sessions.delay")
+    def test_sweep_skips_failed_payments_and_free_books(self, create_sessions):
+        failed = self.pay(self.borrow())
+        Payment.objects.filter(id=failed.id).update(
+            status="FAILED", created_at=timezone.now() - timedelta(hours=1)
+        )
+        self.book.daily_fee = 0
+        self.book.save()
+        self.borrow(days=-5, returned_after=3)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(create_payments(), 0)
+
+        self.assertFalse(Payment.objects.filter(type="FINE").exists())
+        create_sessions.assert_not_called()
+
+
+class PaymentSessionTests(PaymentTestCase):
+
+    def run_sessions(self, stub, payment_ids, retries=1):
+        client = PaymentClient(
+            "sk_test", api_base=stub.url, max_network_retries=retries
+        )
+        with mock.patch("library.tasks.get_payment_client", return_value=client):
+            return create_payment_sessions(payment_ids)
+
+    def test_sessions_are_opened_and_stored(self):
+        payments = [self.pay(self.borrow()) for _ in range(3)]
+
+        with StripeStub() as stub:
+            with self.assertNumQueries(2):
+                opened = self.run_sessions(stub, [p.id for p in payments])
+
+        self.assertEqual(opened, 3)
+        for payment in payments:
+            payment.refresh_from_db()
+            session = stub.sessions[payment.session_id]
+            self.assertEqual(session["client_reference_id"], str(payment.id))
+            self.assertEqual(session["amount_total"], 600)
+            self.assertEqual(payment.session_url, session["url"])
+
+    def test_retry_reuses_idempotency_key(self):
+        payment = self.pay(self.borrow())
+
+        with StripeStub(fail_next=1) as stub:
+            self.assertEqual(self.run_sessions(stub, [payment.id]), 1)
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(
+            {key for _, key, _ in stub.requests}, {str(payment.idempotency_key)}
+        )
+        self.assertEqual(len(stub.sessions), 1)
+
+    def test_failed_payments_are_left_for_the_sweep(self):
+        payment = self.pay(self.borrow())
+
+        with StripeStub(fail_next=1) as stub:
+            self.assertEqual(self.run_sessions(stub, [payment.id], retries=0), 0)
+            payment.refresh_from_db()
+            self.assertIsNone(payment.session_id)
+
+            self.assertEqual(self.run_sessions(stub, [payment.id]), 1)
+            self.assertEqual(self.run_sessions(stub, [payment.id]), 0)
+
+        self.assertEqual(len(stub.sessions), 1)
+
+    def test_rejected_payments_are_marked_failed(self):
+        rejected = Payment.objects.create(
+            borrowing=self.borrow(), type="FINE", money_to_pay=Decimal("0.30")
+        )
+        payment = self.pay(self.borrow())
+
+        with StripeStub() as stub:
+            opened = self.run_sessions(stub, [rejected.id, payment.id])
+            self.assertEqual(self.run_sessions(stub, [rejected.id]), 0)
+
+        self.assertEqual(opened, 1)
+        self.assertEqual(len(stub.requests), 2)
+        rejected.refresh_from_db()
+        self.assertEqual(rejected.status, "FAILED")
+        self.assertIsNone(rejected.session_id)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "PENDING")
+        self.assertIsNotNone(payment.session_id)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+@mock.patch("library.tasks.ADMIN_CHAT_IDS", [1])
+@mock.patch("library.telegram.TelegramClient.send_message")
+class WebhookTests(PaymentTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.stub = StripeStub(webhook_secret="whsec_test")
+        self.addCleanup(self.stub.server.server_close)
+
+    def checkout(self, borrowing, payment_type="PAYMENT"):
+        """Open a stub session for a new payment; return the payment and its event."""
+        payment = self.pay(borrowing, payment_type)
+        session = self.stub.open_session({"client_reference_id": str(payment.id)})
+        Payment.objects.filter(id=payment.id).update(session_id=session["id"])
+        return payment, self.stub.completed_event(session["id"])
+
+    def deliver(self, payload, signature=None):
+        return self.client.post(
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature or self.stub.sign(payload),
+        )
+
+    def test_webhook_stores_signed_events_once(self, send_message):
+        _, event = self.checkout(self.borrow())
+
+        self.assertEqual(self.deliver(event).status_code, 200)
+        self.assertEqual(self.deliver(event).status_code, 200)
+
+        stored = WebhookEvent.objects.get()
+        self.assertEqual(stored.id, json.loads(event)["id"])
+        self.assertIsNone(stored.processed_at)
+        self.assertFalse(Payment.objects.filter(status="PAID").exists())
+
+    def test_webhook_rejects_bad_signatures(self, send_message):
+        _, event = self.checkout(self.borrow())
+        forged = self.stub.sign(event).replace("v1=", "v1=0")
+
+        self.assertEqual(self.deliver(event, forged).status_code, 400)
+        self.assertEqual(self.deliver(b"not json").status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_webhook_drops_unhandled_types(self, send_message):
+        payload = json.dumps({"id": "evt_1", "type": "charge.refunded"}).encode()
+
+        self.assertEqual(self.deliver(payload).status_code, 200)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_processing_marks_payments_paid(self, send_message):
+        borrowing = self.borrow()
+        payment, event = self.checkout(borrowing)
+        fine, fine_event = self.checkout(borrowing, "FINE")
+        for payload in (event, fine_event, event):
+            self.deliver(payload)
+
+        with mock.patch(
+            "library.tasks.send_notifications.delay", send_notifications
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_webhook_events(), 2)
+
+        self.assertEqual(
+            set(Payment.objects.values_list("status", flat=True)), {"PAID"}
+        )
+        borrowing.refresh_from_db()
+        self.assertEqual(borrowing.fees_paid, Decimal("12.00"))
+        notifs = Notification.objects.filter(type="PAYMENT_SUCCESS")
+        self.assertEqual({n.payment_id for n in notifs}, {payment.id, fine.id})
+        self.assertEqual({n.status for n in notifs}, {"SENT"})
+        self.assertIn(
+            "Payment received: 6.00 USD fine for Test Book by user@test.com",
+            [call.args[1] for call in send_message.call_args_list],
+        )
+        self.assertEqual(process_webhook_events(), 0)
+
+    @mock.patch("library.tasks.publish")
+    def test_processing_query_count_is_constant(self, publish, send_message):
+        for _ in range(20):
+            self.deliver(self.checkout(self.borrow())[1])
+
+        with self.assertNumQueries(12), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_webhook_events(), 20)
+
+        self.assertEqual(Payment.objects.filter(status="PAID").count(), 20)
+        self.assertEqual(len(publish.call_args[0][0]), 20)
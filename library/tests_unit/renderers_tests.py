@@ -0,0 +1,122 @@
+import json
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import msgpack
+from django.test import TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from library.models import Book, Borrowing, Cover
+from library.renderers import MessagePackRenderer, ORJSONRenderer
+from library.serializers import (
+    BookDetailSerializer,
+    BookListSerializer,
+    BorrowingListSerializer,
+)
+from user.models import User
+
+
+BOOK_URL = "/api/library/books/"
+BORROWING_URL = "/api/library/borrowings/"
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class RendererTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="ünïcode@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Ein Buch\u2028über «Zeilen»",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=Decimal("1.50")
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+
+    def assertSameJSON(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ORJSONRendererTests(RendererTestCase):
+
+    def test_serializer_payloads_render_identically(self):
+        self.borrowing.actual_return_date = date.today()
+        self.borrowing.save()
+        borrowings = Borrowing.objects.select_related("book", "user")
+
+        self.assertSameJSON(BookListSerializer(Book.objects.all(), many=True).data)
+        self.assertSameJSON(BookDetailSerializer(self.book).data)
+        self.assertSameJSON(BorrowingListSerializer(borrowings, many=True).data)
+
+    def test_python_values_render_identically(self):
+        self.assertSameJSON(
+            {
+                "fee": Decimal("12.30"),
+                "date": date(2026, 1, 2),
+                "datetime": datetime(2026, 1, 2, 3, 4, 5, 678901, timezone.utc),
+                "naive": datetime(2026, 1, 2, 3, 4, 5),
+                "time": time(3, 4, 5, 678901),
+                "duration": timedelta(days=1, seconds=30),
+                "uuid": uuid.UUID(int=7),
+                "lazy": gettext_lazy("Overdue"),
+                "queryset": Book.objects.values_list("id", flat=True),
+                1: ["\u2029", None, True, 1.5],
+            }
+        )
+
+    def test_indent_falls_back_to_json(self):
+        data = {"title": "Book"}
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+    def test_integers_past_64_bits_fall_back_to_json(self):
+        self.assertSameJSON({"big": 2**70})
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_list_endpoints_use_orjson(self):
+        self.client.force_authenticate(user=self.user)
+
+        for url in (BOOK_URL, BORROWING_URL):
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class MessagePackRendererTests(RendererTestCase):
+
+    def test_accept_header_selects_msgpack(self):
+        self.client.force_authenticate(user=self.user)
+
+        for url in (BOOK_URL, BORROWING_URL):
+            json_response = self.client.get(url)
+            response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+
+            self.assertEqual(response["Content-Type"], "application/msgpack")
+            self.assertEqual(
+                msgpack.unpackb(response.content), json.loads(json_response.content)
+            )
+
+    def test_decimals_and_dates_encode_as_in_json(self):
+        data = {"fee": Decimal("1.50"), "due": date(2026, 1, 2)}
+
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
@@ -0,0 +1,382 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from library import metrics
+from library.models import Book, Borrowing, Cover, Notification, OutboxEvent
+from library.tasks import (
+    check_overdue_borrowings,
+    dispatch_notifications,
+    relay_outbox,
+    send_notification_digest,
+    send_notifications,
+)
+from user.models import User
+
+
+class OverdueScanTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+
+    def borrow(self, days, returned=False):
+        return Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=days),
+            actual_return_date=date.today() if returned else None,
+        )
+
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_scan_notifies_each_overdue_borrowing_once(self, delay):
+        overdue = self.borrow(-3)
+        self.borrow(-3, returned=True)
+        self.borrow(3)
+
+        self.assertEqual(check_overdue_borrowings(), 1)
+        self.assertEqual(check_overdue_borrowings(), 0)
+
+        notifs = Notification.objects.filter(type="OVERDUE")
+        self.assertEqual([n.borrowing_id for n in notifs], [overdue.id])
+        delay.assert_called_once_with([notifs[0].id])
+
+    @mock.patch("library.tasks.OVERDUE_BATCH_SIZE", 2)
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_scan_dispatches_one_task_per_chunk(self, delay):
+        for _ in range(5):
+            self.borrow(-1)
+
+        self.assertEqual(check_overdue_borrowings(), 5)
+
+        self.assertEqual(delay.call_count, 3)
+        self.assertEqual(
+            Notification.objects.filter(type="OVERDUE").count(), 5
+        )
+
+
+@mock.patch("library.tasks.ADMIN_CHAT_IDS", [1, 2])
+@mock.patch("library.telegram.TelegramClient.send_message")
+class SendNotificationsTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+        borrowing = Borrowing.objects.create(
+            user=user,
+            book=book,
+            expected_return_date=date.today() - timedelta(days=1),
+        )
+        self.notif = Notification.objects.create(
+            type="OVERDUE", borrowing=borrowing
+        )
+
+    def test_send_notifications_marks_sent(self, send_message):
+        send_notifications([self.notif.id])
+
+        self.notif.refresh_from_db()
+        self.assertEqual(self.notif.status, "SENT")
+        self.assertIsNotNone(self.notif.sent_at)
+        self.assertEqual(send_message.call_count, 2)
+        self.assertIn("Overdue borrowing: Test Book", send_message.call_args[0][1])
+
+    def test_send_notifications_query_count_is_constant(self, send_message):
+        notifs = [self.notif] + [
+            Notification.objects.create(
+                type="OVERDUE",
+                borrowing=Borrowing.objects.create(
+                    user=self.notif.borrowing.user,
+                    book=self.notif.borrowing.book,
+                    expected_return_date=date.today() - timedelta(days=1),
+                ),
+            )
+            for _ in range(19)
+        ]
+
+        with self.assertNumQueries(6):
+            send_notifications([self.notif.id])
+        send_message.side_effect = [None, ConnectionError("down")] * 19
+        with self.assertNumQueries(6):
+            self.assertEqual(send_notifications([n.id for n in notifs[1:]]), 19)
+
+        self.assertEqual(
+            Notification.objects.filter(type="OVERDUE", status="FAILED").count(), 19
+        )
+
+    def test_rows_are_claimed_chunk_by_chunk(self, send_message):
+        other = Notification.objects.create(
+            type="NEW_BORROWING", borrowing=self.notif.borrowing
+        )
+        statuses = []
+
+        def broadcast(text):
+            statuses.append(Notification.objects.get(id=other.id).status)
+
+        with mock.patch("library.tasks.DELIVERY_CHUNK_SIZE", 1), mock.patch(
+            "library.tasks.broadcast", side_effect=broadcast
+        ):
+            self.assertEqual(send_notifications([self.notif.id, other.id]), 2)
+
+        self.assertEqual(statuses, ["PENDING", "SENDING"])
+
+    def test_send_notifications_delivers_once(self, send_message):
+        send_notifications([self.notif.id])
+        send_notifications([self.notif.id])
+
+        self.assertEqual(send_message.call_count, 2)
+
+    def test_failed_delivery_backs_off(self, send_message):
+        send_message.side_effect = ConnectionError("Telegram is down")
+
+        send_notifications([self.notif.id])
+
+        self.notif.refresh_from_db()
+        self.assertEqual(self.notif.status, "FAILED")
+        self.assertEqual(self.notif.attempts, 1)
+        self.assertEqual(self.notif.error_message, "Telegram is down")
+        self.assertIsNone(self.notif.leased_until)
+        self.assertGreater(self.notif.next_attempt_at, timezone.now())
+        self.assertFalse(Notification.objects.due().exists())
+
+
+class OutboxRelayTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+
+    def borrow(self):
+        return Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today() + timedelta(days=7),
+        )
+
+    @mock.patch("library.tasks.OUTBOX_BATCH_SIZE", 2)
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_relay_drains_events_in_batches(self, delay):
+        borrowings = [self.borrow() for _ in range(5)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(relay_outbox(), 5)
+
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(delay.call_count, 3)
+        notifs = Notification.objects.filter(type="NEW_BORROWING")
+        self.assertEqual(
+            {n.borrowing_id for n in notifs}, {b.id for b in borrowings}
+        )
+
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_relay_publishes_only_after_commit(self, delay):
+        self.borrow()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            relay_outbox()
+
+        delay.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_relay_skips_deleted_borrowings(self, delay):
+        self.borrow().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+@override_settings(NOTIFICATION_MAX_ATTEMPTS=3)
+@mock.patch("library.tasks.ADMIN_CHAT_IDS", [1])
+@mock.patch("library.telegram.TelegramClient.send_message")
+class NotificationOutageTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+        Borrowing.objects.create(
+            user=user,
+            book=book,
+            expected_return_date=date.today() - timedelta(days=1),
+        )
+
+    def run_beat(self):
+        """One beat tick with the backoff and leases already elapsed."""
+        Notification.objects.update(next_attempt_at=timezone.now())
+        with mock.patch(
+            "library.tasks.send_notifications.delay", send_notifications
+        ), self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+            check_overdue_borrowings()
+            dispatch_notifications()
+
+    def test_outage_costs_bounded_rows_and_attempts(self, send_message):
+        send_message.side_effect = ConnectionError("Telegram is down")
+
+        for _ in range(10):
+            self.run_beat()
+
+        overdue = Notification.objects.get(type="OVERDUE")
+        self.assertEqual(overdue.status, "FAILED")
+        self.assertEqual(overdue.attempts, 3)
+        self.assertEqual(Notification.objects.filter(type="OVERDUE").count(), 1)
+        self.assertEqual(send_message.call_count, 6)
+
+    def test_redelivers_after_worker_dies_mid_send(self, send_message):
+        self.run_beat()
+        send_message.reset_mock()
+        # The worker died after claiming the row: it stays SENDING until
+        # the lease runs out.
+        Notification.objects.filter(type="OVERDUE").update(
+            status="SENDING",
+            leased_until=timezone.now() - timedelta(seconds=1),
+        )
+
+        self.run_beat()
+
+        overdue = Notification.objects.get(type="OVERDUE")
+        self.assertEqual(overdue.status, "SENT")
+        self.assertEqual(overdue.attempts, 2)
+        self.assertIsNone(overdue.leased_until)
+        send_message.assert_called_once()
+
+    def test_recovers_after_outage(self, send_message):
+        send_message.side_effect = ConnectionError("Telegram is down")
+        self.run_beat()
+        send_message.side_effect = None
+
+        self.run_beat()
+
+        self.assertEqual(
+            set(Notification.objects.values_list("status", flat=True)), {"SENT"}
+        )
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW=60, NOTIFICATION_DIGEST_TOP_ITEMS=2)
+@mock.patch("library.tasks.ADMIN_CHAT_IDS", [1, 2])
+@mock.patch("library.telegram.TelegramClient.send_message")
+class NotificationDigestTests(TestCase):
+
+    def setUp(self):
+        metrics.notification_deliveries.clear()
+        user = User.objects.create_user(
+            email="user@test.com",
+            password="testpass123"
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=10,
+            cover=Cover.HARD,
+            daily_fee=1.00
+        )
+        for days in (-3, -2, -1, 5):
+            Borrowing.objects.create(
+                user=user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=days),
+            )
+
+    @mock.patch("library.tasks.send_notifications.delay")
+    def test_digest_mode_enqueues_no_per_event_tasks(self, delay, send_message):
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+        check_overdue_borrowings()
+        Notification.objects.update(next_attempt_at=timezone.now())
+        dispatch_notifications()
+
+        delay.assert_not_called()
+        self.assertEqual(Notification.objects.filter(status="PENDING").count(), 7)
+
+    def test_digest_sends_one_summary_per_chat(self, send_message):
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+        check_overdue_borrowings()
+
+        with self.assertNumQueries(9):
+            self.assertEqual(send_notification_digest(), 7)
+
+        self.assertEqual(send_message.call_count, 2)
+        text = send_message.call_args[0][1]
+        self.assertIn("Library digest: 7 notifications", text)
+        self.assertIn("New Borrowing (4):", text)
+        self.assertIn("Overdue (3):", text)
+        self.assertIn("... and 2 more", text)
+        self.assertIn("... and 1 more", text)
+        self.assertEqual(
+            set(Notification.objects.values_list("status", flat=True)), {"SENT"}
+        )
+        deliveries = metrics.notification_deliveries
+        self.assertEqual(deliveries.value("NEW_BORROWING", "sent", "no"), 4)
+        self.assertEqual(deliveries.value("OVERDUE", "sent", "no"), 3)
+        self.assertEqual(send_notification_digest(), 0)
+
+    def test_outage_keeps_every_row_for_the_next_digest(self, send_message):
+        with self.captureOnCommitCallbacks(execute=True):
+            relay_outbox()
+        check_overdue_borrowings()
+        send_message.side_effect = ConnectionError("Telegram is down")
+
+        for _ in range(settings.NOTIFICATION_MAX_ATTEMPTS + 2):
+            with self.assertRaises(ConnectionError):
+                send_notification_digest()
+
+        self.assertEqual(
+            set(Notification.objects.values_list("attempts", flat=True)), {0}
+        )
+        send_message.side_effect = None
+        send_message.reset_mock()
+
+        self.assertEqual(send_notification_digest(), 7)
+
+        self.assertIn("Library digest: 7 notifications", send_message.call_args[0][1])
+        deliveries = metrics.notification_deliveries
+        retries = settings.NOTIFICATION_MAX_ATTEMPTS + 1
+        self.assertEqual(deliveries.value("OVERDUE", "failed", "no"), 3)
+        self.assertEqual(deliveries.value("OVERDUE", "failed", "yes"), 3 * retries)
+        self.assertEqual(deliveries.value("OVERDUE", "sent", "yes"), 3)
+        self.assertEqual(deliveries.value("NEW_BORROWING", "sent", "yes"), 4)
+        self.assertEqual(
+            set(Notification.objects.values_list("status", flat=True)), {"SENT"}
+        )
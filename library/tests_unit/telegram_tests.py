@@ -0,0 +1,114 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from library.telegram import SharedRateLimit, TelegramClient, TokenBucket
+from library.telegram_stub import TelegramStub
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_bucket_spaces_acquisitions(self):
+        bucket = TokenBucket(rate=20)
+
+        started = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+    def test_bucket_allows_bursts_up_to_capacity(self):
+        bucket = TokenBucket(rate=1, capacity=5)
+
+        started = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+
+        self.assertLess(time.monotonic() - started, 0.1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SharedRateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limit_is_shared_between_processes(self):
+        clock = FakeClock()
+        # One limiter per worker process, on the same key.
+        workers = [SharedRateLimit("test:shared", rate=2) for _ in range(2)]
+
+        granted = []
+        with mock.patch("library.telegram.time", clock):
+            for _ in range(3):
+                for limit in workers:
+                    limit.acquire()
+                    granted.append(clock.now)
+
+        self.assertEqual(
+            [int(t) for t in granted], [1000, 1000, 1001, 1001, 1002, 1002]
+        )
+
+
+class TelegramClientTests(SimpleTestCase):
+
+    def make_client(self, stub, **kwargs):
+        kwargs.setdefault("global_rate", 1000)
+        kwargs.setdefault("chat_rate", 1000)
+        client = TelegramClient("token", api_url=stub.url, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_broadcast_sends_to_all_chats_concurrently(self):
+        with TelegramStub(latency=0.2) as stub:
+            client = self.make_client(stub)
+
+            started = time.monotonic()
+            client.broadcast(range(5), "hello")
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(sorted(chat for _, chat, _ in stub.messages), list("01234"))
+        self.assertLess(elapsed, 0.6)
+
+    def test_connections_are_reused(self):
+        with TelegramStub() as stub:
+            client = self.make_client(stub, pool_size=2)
+
+            for _ in range(10):
+                client.broadcast([1, 2], "hello")
+
+        self.assertEqual(len(stub.messages), 20)
+        self.assertLessEqual(stub.connections, 2)
+
+    def test_per_chat_rate_limit(self):
+        with TelegramStub() as stub:
+            client = self.make_client(stub, chat_rate=20)
+
+            for _ in range(5):
+                client.broadcast([1, 2], "hello")
+
+        for chat_id in (1, 2):
+            times = stub.times(chat_id)
+            self.assertGreaterEqual(times[-1] - times[0], 0.19)
+
+    def test_global_rate_limit(self):
+        with TelegramStub() as stub:
+            client = self.make_client(stub, global_rate=20)
+
+            client.broadcast(range(30), "hello")
+
+        times = stub.times()
+        self.assertEqual(len(times), 30)
+        self.assertGreaterEqual(times[-1] - times[0], 0.45)
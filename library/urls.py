@@ -1,15 +1,22 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from library.views import BookViewSet, BorrowingViewSet
+from library.views import (
+    BookViewSet,
+    BorrowingViewSet,
+    PaymentViewSet,
+    StripeWebhookView,
+)
 
 
 router = routers.DefaultRouter()
 router.register("books", BookViewSet)
 router.register("borrowings", BorrowingViewSet)
+router.register("payments", PaymentViewSet)
 
 app_name = "library"
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("stripe/webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
 ]
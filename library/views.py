@@ -1,32 +1,85 @@
+import json
+from collections import Counter
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema
 
-from library.models import Book, Borrowing
+from library import cache, metrics
+from library.asyncviews import AsyncViewMixin
+from library.conditional import ConditionalGetMixin
+from library.export import export_response
+from library.models import Book, Borrowing, OutboxEvent, Payment, WebhookEvent
+from library.pagination import KeysetPagination
+from library.renderers import PrometheusRenderer
 from library.serializers import (
     BookListSerializer,
     BookDetailSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer,
+    BorrowingBulkCreateSerializer,
+    BorrowingBulkReturnSerializer,
+    BorrowingExportSerializer,
+    BorrowingFeesSerializer,
+    PaymentSerializer,
 )
 
 
 # Create your views here.
 class BookViewSet(
+    AsyncViewMixin,
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
     queryset = Book.objects.all()
+    pagination_class = KeysetPagination
+    lookup_value_regex = r"\d+"
+    list_from_columns = True
 
     def get_serializer_class(self):
         if self.action == "list":
             return BookListSerializer
         return BookDetailSerializer
 
+    def list(self, request, *args, **kwargs):
+        return cache.cached_response(
+            request,
+            cache.list_key(request),
+            lambda: super(BookViewSet, self).list(request, *args, **kwargs),
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await cache.acached_response(
+            request,
+            await cache.alist_key(request),
+            lambda: super(BookViewSet, self).alist(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cache.cached_response(
+            request,
+            cache.detail_key(int(kwargs["pk"])),
+            lambda: super(BookViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await cache.acached_response(
+            request,
+            cache.detail_key(int(kwargs["pk"])),
+            lambda: super(BookViewSet, self).aretrieve(request, *args, **kwargs),
+        )
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [IsAdminUser]
@@ -36,14 +89,49 @@ class BookViewSet(
 
 
 class BorrowingViewSet(
+    AsyncViewMixin,
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
 
-    queryset = Borrowing.objects.all().select_related()
+    queryset = Borrowing.objects.all()
     permission_classes = [IsAuthenticated, ]
+    pagination_class = KeysetPagination
+    lookup_value_regex = r"\d+"
+    list_from_columns = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = queryset.select_related("book", "user").only(
+                "id",
+                "borrow_date",
+                "expected_return_date",
+                "actual_return_date",
+                "updated_at",
+                "book__title",
+                "user__email",
+            )
+            if not self.request.user.is_staff:
+                queryset = queryset.filter(user=self.request.user)
+        elif self.action == "retrieve":
+            queryset = queryset.only(
+                "id",
+                "book",
+                "user",
+                "borrow_date",
+                "expected_return_date",
+                "fees_paid",
+                "updated_at",
+            ).with_fees()
+        return queryset
+
+    def get_validator_salt(self):
+        # Fees of open borrowings grow every day without the row changing.
+        return timezone.localdate().isoformat()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -51,43 +139,237 @@ class BorrowingViewSet(
     def get_serializer_class(self):
         if self.action == "list":
             return BorrowingListSerializer
+        if self.action == "bulk_checkout":
+            return BorrowingBulkCreateSerializer
+        if self.action == "bulk_return":
+            return BorrowingBulkReturnSerializer
+        if self.action == "export":
+            return BorrowingExportSerializer
+        if self.action == "fees":
+            return BorrowingFeesSerializer
         return BorrowingDetailSerializer
 
     def create(self, request, *args, **kwargs):
         book_id = request.data.get("book")
-        book = Book.objects.get(id=book_id)
-
-        if book.inventory <= 0:
-            return Response(
-                {"error": "Book not available"}, status=status.HTTP_400_BAD_REQUEST
-            )
 
-        book.inventory -= 1
-        book.save()
+        with transaction.atomic():
+            if not Book.objects.filter(id=book_id).reserve():
+                get_object_or_404(Book, id=book_id)
+                return Response(
+                    {"error": "Book not available"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-        borrowing = Borrowing.objects.create(
-            user=request.user,
-            book=book,
-            expected_return_date=request.data.get("expected_return_date"),
-        )
+            borrowing = Borrowing.objects.create(
+                user=request.user,
+                book_id=book_id,
+                expected_return_date=request.data.get("expected_return_date"),
+            )
         return Response(
             {"id": borrowing.id, "message": "Borrowing created"},
             status=status.HTTP_201_CREATED,
         )
 
-    @action(detail=True, methods=["get", "post"])
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_checkout(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        book_ids = serializer.validated_data["books"]
+        expected_return_date = serializer.validated_data["expected_return_date"]
+
+        with transaction.atomic():
+            reserved = Book.objects.reserve_many(book_ids)
+
+            accepted, failed = [], []
+            for book_id in book_ids:
+                if reserved.get(book_id):
+                    reserved[book_id] -= 1
+                    accepted.append(book_id)
+                else:
+                    failed.append({"book": book_id, "error": "Book not available"})
+
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(
+                    user=request.user,
+                    book_id=book_id,
+                    expected_return_date=expected_return_date,
+                )
+                for book_id in accepted
+            )
+            if borrowings:
+                OutboxEvent.objects.create(
+                    topic="borrowing.bulk_created",
+                    payload={"borrowing_ids": [b.id for b in borrowings]},
+                )
+
+        return Response(
+            {
+                "created": [{"id": b.id, "book": b.book_id} for b in borrowings],
+                "failed": failed,
+            },
+            status=(
+                status.HTTP_201_CREATED if borrowings
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @action(detail=True, methods=["post"])
     def return_book(self, request, pk=None):
-        borrowing = self.get_object()
-        if borrowing.actual_return_date:
+        borrowings = self.get_queryset().filter(pk=pk)
+
+        now = timezone.now()
+        with transaction.atomic():
+            returned = borrowings.filter(actual_return_date__isnull=True).update(
+                actual_return_date=now.date(), updated_at=now
+            )
+            if returned:
+                Book.objects.filter(borrowing__pk=pk).restock()
+
+        if not returned:
+            get_object_or_404(borrowings)
             return Response(
                 {"error": "Already returned"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        borrowing.actual_return_date = timezone.now()
-        borrowing.save()
+        return Response({"message": "Book returned successfully"})
 
-        book = borrowing.book
-        book.inventory += 1
-        book.save()
+    @action(detail=False, methods=["post"])
+    def bulk_return(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+        borrowings = self.get_queryset().filter(id__in=ids)
+        if not request.user.is_staff:
+            # Other users' borrowings are reported as not found.
+            borrowings = borrowings.filter(user=request.user)
 
-        return Response({"message": "Book returned successfully"})
+        with transaction.atomic():
+            returning = dict(
+                borrowings.select_for_update()
+                .filter(actual_return_date__isnull=True)
+                .order_by("id")
+                .values_list("id", "book_id")
+            )
+            if returning:
+                now = timezone.now()
+                Borrowing.objects.filter(id__in=returning).update(
+                    actual_return_date=now.date(), updated_at=now
+                )
+                Book.objects.restock_many(Counter(returning.values()))
+
+        existing = set(returning)
+        if len(existing) < len(ids):
+            existing = set(borrowings.values_list("id", flat=True))
+
+        results = {}
+        for pk in sorted(ids):
+            if pk in returning:
+                results[pk] = "returned"
+            elif pk in existing:
+                results[pk] = "already_returned"
+            else:
+                results[pk] = "not_found"
+        return Response({"results": results})
+
+    @action(detail=False, methods=["get"])
+    def fees(self, request):
+        """What the requesting user owes; staff may pass ``?user=<id>``."""
+        user_id = request.user.id
+        if request.user.is_staff and "user" in request.query_params:
+            user_id = request.query_params["user"]
+        if not str(user_id).isdigit():
+            return Response(
+                {"error": "Invalid user"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        totals = Borrowing.objects.filter(user_id=user_id).fee_totals().first()
+        if totals is None:
+            totals = {"base": 0, "overdue": 0, "total": 0}
+        return Response(self.get_serializer(totals).data)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+
+        borrowings = Borrowing.objects.order_by("id")
+        if "borrowed_after" in filters:
+            borrowings = borrowings.filter(borrow_date__gte=filters["borrowed_after"])
+        if "borrowed_before" in filters:
+            borrowings = borrowings.filter(borrow_date__lte=filters["borrowed_before"])
+        if "user" in filters:
+            borrowings = borrowings.filter(user_id=filters["user"])
+        if "status" in filters:
+            borrowings = borrowings.filter(
+                actual_return_date__isnull=filters["status"] == "open"
+            )
+        return export_response(borrowings, filters["output"])
+
+
+class PaymentViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    queryset = Payment.objects.select_related("borrowing__book").order_by("-id")
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAuthenticated, ]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(borrowing__user=self.request.user)
+        return queryset
+
+
+class StripeWebhookView(APIView):
+    """
+    Accept Stripe events.
+
+    The handler only verifies the signature and stores the event, so Stripe
+    gets its answer at once; process_webhook_events settles the payments
+    in batches. Redelivered events are stored once.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    @extend_schema(exclude=True)
+    def post(self, request):
+        payload = request.body
+        try:
+            if not settings.STRIPE_WEBHOOK_SECRET:
+                raise stripe.SignatureVerificationError("No secret", "")
+            stripe.WebhookSignature.verify_header(
+                payload.decode(),
+                request.headers.get("Stripe-Signature", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+                stripe.Webhook.DEFAULT_TOLERANCE,
+            )
+            event = json.loads(payload)
+            event_id, event_type = event["id"], event["type"]
+        except (ValueError, KeyError, TypeError, stripe.SignatureVerificationError):
+            return Response(
+                {"error": "Invalid event"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if event_type in WebhookEvent.PAID_TYPES:
+            WebhookEvent.objects.bulk_create(
+                [WebhookEvent(id=event_id, type=event_type, payload=event)],
+                ignore_conflicts=True,
+            )
+        return Response(status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """This process's metrics, in the Prometheus text format, for staff."""
+
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+    throttle_classes = []
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
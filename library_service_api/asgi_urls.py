@@ -0,0 +1,22 @@
+"""
+URL configuration for the ASGI server.
+
+The same routes as library_service_api.urls, with the library and user
+apps' reads served by their async views (library.async_urls and
+user.async_urls). Selected by ASYNC_VIEWS=1, which asgi.py sets.
+"""
+
+from django.urls import include, path
+
+from library_service_api.urls import urlpatterns as sync_urlpatterns
+
+
+urlpatterns = [
+    path("api/library/", include("library.async_urls", namespace="library")),
+    path("api/user/", include("user.async_urls", namespace="user")),
+    *(
+        pattern
+        for pattern in sync_urlpatterns
+        if getattr(pattern, "namespace", None) not in ("library", "user")
+    ),
+]
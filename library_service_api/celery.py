@@ -1,11 +1,16 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service_api.settings")
 
-app = Celery("library_service_api")
+# Every task runs under InstrumentedTask, which records its queries and
+# wall time and logs slow runs.
+app = Celery(
+    "library_service_api", task_cls="library.instrumentation:InstrumentedTask"
+)
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
@@ -17,6 +22,18 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def serve_metrics(**kwargs):
+    """Expose each worker process's metrics on a port of its own."""
+    from billiard.process import current_process
+    from django.conf import settings
+
+    from library import metrics
+
+    if settings.WORKER_METRICS_PORT:
+        metrics.serve(metrics.worker_port(getattr(current_process(), "index", 0)))
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
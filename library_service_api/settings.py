@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from datetime import timedelta
 from pathlib import Path
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library.instrumentation.QueryTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -58,7 +60,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "library_service_api.urls"
+# Serve the catalog, borrowing and profile reads with async views. asgi.py
+# turns this on; under WSGI each async view would need an event loop of
+# its own, so the sync views serve there.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS") == "1"
+
+ROOT_URLCONF = (
+    "library_service_api.asgi_urls" if ASYNC_VIEWS else "library_service_api.urls"
+)
 
 TEMPLATES = [
     {
@@ -146,6 +155,12 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "library.permissions.IsAdminOrIfAuthenticatedReadOnly"
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "library.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        # Clients opt in with "Accept: application/msgpack".
+        "library.renderers.MessagePackRenderer",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 5,
     "DEFAULT_AUTHENTICATION_CLASSES": (
@@ -166,6 +181,44 @@ SIMPLE_JWT = {
 }
 
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://redis:6379/1"),
+    }
+}
+
+# Requests and Celery tasks slower than these many milliseconds are
+# logged to "library.performance" with their SLOW_QUERIES_LOGGED slowest
+# queries.
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 500))
+SLOW_TASK_MS = int(os.getenv("SLOW_TASK_MS", 5000))
+SLOW_QUERIES_LOGGED = 3
+
+# Celery worker process N serves its metrics on WORKER_METRICS_PORT + N
+# (0 turns this off). API processes serve theirs at /api/metrics/.
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 0))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "library.performance": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
+# Every day a book is kept past its expected return date costs its
+# daily_fee times FINE_MULTIPLIER.
+FINE_MULTIPLIER = 2
+
+# Upper bound on how long a cached catalog response can outlive a change
+# that raced with the request that cached it.
+CATALOG_CACHE_TIMEOUT = 300
+
+
 CELERY_BROKER_URL = os.getenv("CONNECTION_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CONNECTION_URL", "redis://redis:6379/0")
 CELERY_TIMEZONE = "Europe/Kyiv"
@@ -175,11 +228,70 @@ CELERY_BEAT_SCHEDULE = {
         "task": "library.tasks.check_overdue_borrowings",
         "schedule": 30,
     },
+    "dispatch-notifications": {
+        "task": "library.tasks.dispatch_notifications",
+        "schedule": 30,
+    },
+    "relay-outbox": {
+        "task": "library.tasks.relay_outbox",
+        "schedule": 2,
+    },
+    "create-payments": {
+        "task": "library.tasks.create_payments",
+        "schedule": 60,
+    },
+    "process-webhook-events": {
+        "task": "library.tasks.process_webhook_events",
+        "schedule": 2,
+    },
+    "run-billing": {
+        "task": "library.tasks.run_billing",
+        "schedule": crontab(minute=0, hour=1, day_of_month=1),
+    },
 }
 
+# Notification delivery: a row is tried at most NOTIFICATION_MAX_ATTEMPTS
+# times, waiting NOTIFICATION_RETRY_BACKOFF seconds (doubled per attempt)
+# after a failure. A worker holds a row for NOTIFICATION_LEASE seconds.
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BACKOFF = 60
+NOTIFICATION_LEASE = 300
+
+# When set, admins get one digest per chat every NOTIFICATION_DIGEST_WINDOW
+# seconds instead of one message per event.
+NOTIFICATION_DIGEST_WINDOW = int(os.getenv("NOTIFICATION_DIGEST_WINDOW", 0))
+NOTIFICATION_DIGEST_TOP_ITEMS = 5
+if NOTIFICATION_DIGEST_WINDOW:
+    CELERY_BEAT_SCHEDULE["send-notification-digest"] = {
+        "task": "library.tasks.send_notification_digest",
+        "schedule": NOTIFICATION_DIGEST_WINDOW,
+    }
+
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 TELEGRAM_ADMIN_CHAT_IDS = [int(x) for x in os.getenv(
         "TELEGRAM_ADMIN_CHAT_IDS", "").split(",") if x]
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+# Connections kept alive per worker process, and Telegram's documented
+# limits: ~30 messages per second overall and one per second per chat.
+# The limits hold across worker processes through counters in the
+# default cache, so it must be shared (Redis) outside of tests.
+TELEGRAM_POOL_SIZE = 8
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+# Sessions opened in parallel per worker process, and how often the Stripe
+# library retries a failed request (with the same idempotency key).
+STRIPE_POOL_SIZE = 8
+STRIPE_MAX_NETWORK_RETRIES = 2
+PAYMENT_SUCCESS_URL = os.getenv(
+    "PAYMENT_SUCCESS_URL", "http://localhost:8000/api/library/payments/"
+)
+PAYMENT_CANCEL_URL = os.getenv(
+    "PAYMENT_CANCEL_URL", "http://localhost:8000/api/library/payments/"
+)
 
 
 SPECTACULAR_SETTINGS = {
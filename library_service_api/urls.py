@@ -23,6 +23,8 @@ from rest_framework_simplejwt.views import (
 )
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
+from library.views import MetricsView
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -30,6 +32,7 @@ urlpatterns = [
     path("api/user/", include("user.urls", namespace="user")),
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
     path("api/doc/", SpectacularAPIView.as_view(), name="schema"),
     path("api/doc/swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/doc/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from user.urls import urlpatterns as sync_urlpatterns
+from user.views import ManageUserView
+
+app_name = "user"
+
+urlpatterns = [
+    path("me/", ManageUserView.as_async_view(), name="manage"),
+    *sync_urlpatterns,
+]